@@ -4,6 +4,9 @@ Script para rodar o servidor FastAPI com configurações adequadas.
 Rode: python scripts/run_server.py
 """
 
+import asyncio
+import importlib.util
+import os
 import sys
 from pathlib import Path
 
@@ -12,13 +15,44 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import uvicorn
 from src.core.config import get_settings
+from src.infrastructure.database.session import close_db, init_db
 
 settings = get_settings()
 
 
+async def prepare_database() -> None:
+    """
+    Recria as tabelas (desenvolvimento) uma única vez, antes de subir os
+    workers: no lifespan, cada worker rodaria drop_all/create_all ao mesmo
+    tempo. Fecha o pool em seguida para nenhum worker herdar conexões.
+    """
+    try:
+        await init_db()
+    finally:
+        await close_db()
+
+
+def run_gunicorn(workers: int) -> None:
+    """Substitui o processo atual pelo gunicorn com UvicornWorker"""
+    args = [
+        sys.executable, "-m", "gunicorn",
+        "src.api.main:app",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(workers),
+        "--bind", f"{settings.api_host}:{settings.api_port}",
+        "--preload",
+        "--log-level", settings.log_level.lower(),
+    ]
+    os.execv(sys.executable, args)
+
+
 def main():
     """Inicia o servidor"""
     
+    # Reload só funciona com um único worker (desenvolvimento)
+    reload = settings.is_development and settings.api_reload
+    workers = 1 if reload else settings.worker_count
+    
     print("=" * 60)
     print(f"🚀 INICIANDO {settings.app_name}")
     print("=" * 60)
@@ -26,15 +60,40 @@ def main():
     print(f"🌐 URL: http://{settings.api_host}:{settings.api_port}")
     print(f"📚 Docs: http://{settings.api_host}:{settings.api_port}/docs")
     print(f"❤️  Health: http://{settings.api_host}:{settings.api_port}/health")
+    print(f"⚙️  Workers: {workers}")
     print("\n" + "=" * 60)
     print("⚡ Pressione CTRL+C para parar o servidor")
     print("=" * 60 + "\n")
     
+    if settings.is_development and settings.debug:
+        asyncio.run(prepare_database())
+    
+    if reload:
+        uvicorn.run(
+            "src.api.main:app",
+            host=settings.api_host,
+            port=settings.api_port,
+            reload=True,
+            log_level=settings.log_level.lower()
+        )
+        return
+    
+    # Produção: gunicorn com --preload importa o app uma vez no processo pai
+    # e os workers compartilham essas páginas (copy-on-write) após o fork.
+    # O engine do SQLAlchemy só abre conexões no primeiro uso, então nenhum
+    # socket do banco é herdado pelos workers.
+    if settings.is_production and importlib.util.find_spec("gunicorn"):
+        run_gunicorn(workers)
+        return
+    
+    # uvloop + httptools vêm com uvicorn[standard]
     uvicorn.run(
         "src.api.main:app",
         host=settings.api_host,
         port=settings.api_port,
-        reload=settings.api_reload,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
         log_level=settings.log_level.lower()
     )
 
@@ -6,6 +6,7 @@ Rode: python scripts/test_message_flow.py
 """
 
 import asyncio
+import os
 import sys
 from pathlib import Path
 from datetime import datetime
@@ -13,6 +14,10 @@ from datetime import datetime
 # Adiciona o diretório raiz ao path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Conexões fora da API: o trigger leads_changed avisa os workers (NOTIFY)
+# para invalidarem as estatísticas, já que o script roda sem Redis
+os.environ.setdefault("DB_APPLICATION_NAME", "triagem-scripts")
+
 from loguru import logger
 from src.infrastructure.database.session import get_db_context
 from src.domain.services.message_processor import MessageProcessor
@@ -43,10 +48,14 @@ async def simulate_conversation():
         processor = MessageProcessor(db)
         
         for i, user_message in enumerate(messages, 1):
-            print(f"\n{'─' * 60}")
-            print(f"💬 Mensagem {i}/{len(messages)}")
-            print(f"{'─' * 60}")
-            print(f"\n👤 USUÁRIO: {user_message}\n")
+            # Cabeçalho da mensagem em uma única escrita
+            sys.stdout.write(
+                f"\n{'─' * 60}\n"
+                f"💬 Mensagem {i}/{len(messages)}\n"
+                f"{'─' * 60}\n"
+                f"\n👤 USUÁRIO: {user_message}\n\n"
+            )
+            sys.stdout.flush()
             
             try:
                 # Processa mensagem (simula webhook)
@@ -70,15 +79,18 @@ async def simulate_conversation():
                 print(f"\n❌ ERRO: {e}\n")
                 break
     
-    print("\n" + "=" * 60)
-    print("✅ TESTE CONCLUÍDO!")
-    print("=" * 60)
-    print("\n📊 Para ver os resultados:")
-    print("   1. Acesse: http://localhost:8000/docs")
-    print("   2. Teste o endpoint: GET /api/leads")
-    print("   3. Você verá o lead criado com os dados extraídos\n")
-    print("📝 NOTA: Como não tem WhatsApp configurado, as respostas")
-    print("   não serão enviadas, mas você verá nos logs!\n")
+    print(
+        "\n" + "=" * 60,
+        "✅ TESTE CONCLUÍDO!",
+        "=" * 60,
+        "\n📊 Para ver os resultados:",
+        "   1. Acesse: http://localhost:8000/docs",
+        "   2. Teste o endpoint: GET /api/leads",
+        "   3. Você verá o lead criado com os dados extraídos\n",
+        "📝 NOTA: Como não tem WhatsApp configurado, as respostas",
+        "   não serão enviadas, mas você verá nos logs!\n",
+        sep="\n"
+    )
 
 
 async def test_ai_only():
@@ -104,22 +116,23 @@ async def test_ai_only():
             lead_data={}
         )
         
-        print("✅ RESPOSTA DA IA:")
-        print(f"\n📝 Texto: {response.response_text}\n")
-        print(f"🎯 Intenção: {response.intent}")
-        print(f"📊 Confiança: {response.confidence}")
-        print(f"\n📋 Dados extraídos:")
-        print(f"   Nome: {response.extracted_data.nome}")
-        print(f"   Cidade: {response.extracted_data.cidade}")
-        print(f"   Tipo: {response.extracted_data.tipo_protese}")
-        print(f"   Urgência: {response.extracted_data.urgencia}")
+        out = [
+            "✅ RESPOSTA DA IA:",
+            f"\n📝 Texto: {response.response_text}\n",
+            f"🎯 Intenção: {response.intent}",
+            f"📊 Confiança: {response.confidence}",
+            f"\n📋 Dados extraídos:",
+            f"   Nome: {response.extracted_data.nome}",
+            f"   Cidade: {response.extracted_data.cidade}",
+            f"   Tipo: {response.extracted_data.tipo_protese}",
+            f"   Urgência: {response.extracted_data.urgencia}",
+        ]
         
         if response.should_transfer_to_human:
-            print(f"\n🔄 Deve transferir para humano: {response.transfer_reason}")
+            out.append(f"\n🔄 Deve transferir para humano: {response.transfer_reason}")
         
-        print("\n" + "=" * 60)
-        print("✅ TESTE DE IA CONCLUÍDO!")
-        print("=" * 60 + "\n")
+        out += ["\n" + "=" * 60, "✅ TESTE DE IA CONCLUÍDO!", "=" * 60 + "\n"]
+        sys.stdout.write("\n".join(out) + "\n")
         
     except Exception as e:
         logger.exception(f"❌ Erro no teste de IA: {e}")
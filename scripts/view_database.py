@@ -7,128 +7,138 @@ Rode: python scripts/view_database.py
 import asyncio
 import sys
 from pathlib import Path
+from typing import List
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from sqlalchemy import select
-from src.infrastructure.database.session import get_db_context
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload, selectinload
+from src.infrastructure.database.session import get_db_read_context
 from src.infrastructure.database.models import Lead, Conversation, Message
 
 
+def _write(lines: List[str]) -> None:
+    """Escreve um bloco de linhas com uma única chamada de I/O"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def _header(title: str) -> List[str]:
+    """Cabeçalho de seção"""
+    return ["", "=" * 60, title, "=" * 60, ""]
+
+
 async def show_leads():
     """Mostra todos os leads"""
     
-    print("\n" + "=" * 60)
-    print("👥 LEADS CADASTRADOS")
-    print("=" * 60 + "\n")
+    out = _header("👥 LEADS CADASTRADOS")
     
-    async with get_db_context() as db:
+    async with get_db_read_context() as db:
         result = await db.execute(select(Lead).order_by(Lead.created_at.desc()))
         leads = result.scalars().all()
         
         if not leads:
-            print("📭 Nenhum lead encontrado ainda.\n")
+            out.append("📭 Nenhum lead encontrado ainda.\n")
+            _write(out)
             return
         
         for i, lead in enumerate(leads, 1):
-            print(f"{i}. 📱 {lead.phone_number}")
+            out.append(f"{i}. 📱 {lead.phone_number}")
             if lead.name:
-                print(f"   👤 Nome: {lead.name}")
+                out.append(f"   👤 Nome: {lead.name}")
             if lead.city:
-                print(f"   📍 Cidade: {lead.city}")
+                out.append(f"   📍 Cidade: {lead.city}")
             if lead.prosthesis_type:
-                print(f"   🦷 Tipo: {lead.prosthesis_type}")
-            print(f"   🎯 Classificação: {lead.classification or 'Não classificado'}")
-            print(f"   📊 Score: {lead.score}")
-            print(f"   📅 Status: {lead.status}")
+                out.append(f"   🦷 Tipo: {lead.prosthesis_type}")
+            out.append(f"   🎯 Classificação: {lead.classification or 'Não classificado'}")
+            out.append(f"   📊 Score: {lead.score}")
+            out.append(f"   📅 Status: {lead.status}")
             if lead.urgency_level:
-                print(f"   ⚠️  Urgência: {lead.urgency_level}")
-            print()
+                out.append(f"   ⚠️  Urgência: {lead.urgency_level}")
+            out.append("")
+    
+    _write(out)
 
 
 async def show_conversations():
     """Mostra conversas com mensagens"""
     
-    print("\n" + "=" * 60)
-    print("💬 CONVERSAS")
-    print("=" * 60 + "\n")
+    out = _header("💬 CONVERSAS")
     
-    async with get_db_context() as db:
+    async with get_db_read_context() as db:
+        # Lead via JOIN e mensagens via SELECT ... IN (2 queries no total)
         result = await db.execute(
             select(Conversation)
+            .options(
+                joinedload(Conversation.lead),
+                selectinload(Conversation.messages)
+            )
             .order_by(Conversation.started_at.desc())
             .limit(5)
         )
         conversations = result.scalars().all()
         
         if not conversations:
-            print("📭 Nenhuma conversa encontrada ainda.\n")
+            out.append("📭 Nenhuma conversa encontrada ainda.\n")
+            _write(out)
             return
         
         for i, conv in enumerate(conversations, 1):
-            # Busca lead
-            lead_result = await db.execute(
-                select(Lead).where(Lead.id == conv.lead_id)
-            )
-            lead = lead_result.scalar_one()
+            out.append(f"\n{i}. Conversa com {conv.lead.phone_number}")
+            out.append(f"   📅 Iniciada: {conv.started_at.strftime('%d/%m/%Y %H:%M')}")
+            out.append(f"   📊 Status: {conv.status}")
+            out.append(f"   💬 Mensagens: {conv.total_messages} (👤 {conv.user_messages} | 🤖 {conv.ai_messages})")
             
-            print(f"\n{i}. Conversa com {lead.phone_number}")
-            print(f"   📅 Iniciada: {conv.started_at.strftime('%d/%m/%Y %H:%M')}")
-            print(f"   📊 Status: {conv.status}")
-            print(f"   💬 Mensagens: {conv.total_messages} (👤 {conv.user_messages} | 🤖 {conv.ai_messages})")
-            
-            # Busca mensagens
-            msg_result = await db.execute(
-                select(Message)
-                .where(Message.conversation_id == conv.id)
-                .order_by(Message.created_at)
-                .limit(10)
-            )
-            messages = msg_result.scalars().all()
+            # Mensagens já carregadas (ordenadas por created_at)
+            messages = conv.messages
             
             if messages:
-                print(f"\n   Últimas mensagens:")
+                out.append(f"\n   Últimas mensagens:")
                 for msg in messages[-5:]:  # Últimas 5
                     icon = "👤" if msg.direction.value == "entrada" else "🤖"
                     preview = msg.content[:60] + "..." if len(msg.content) > 60 else msg.content
-                    print(f"   {icon} {preview}")
+                    out.append(f"   {icon} {preview}")
+    
+    _write(out)
 
 
 async def show_stats():
     """Mostra estatísticas gerais"""
     
-    print("\n" + "=" * 60)
-    print("📊 ESTATÍSTICAS")
-    print("=" * 60 + "\n")
+    out = _header("📊 ESTATÍSTICAS")
     
-    async with get_db_context() as db:
+    async with get_db_read_context() as db:
         # Total de leads
-        total_leads = await db.execute(select(Lead))
-        total = len(total_leads.scalars().all())
+        total = await db.scalar(select(func.count()).select_from(Lead))
+        
+        # Por classificação (uma única query agrupada)
+        result = await db.execute(
+            select(Lead.classification, func.count()).group_by(Lead.classification)
+        )
+        classification_counts = {
+            getattr(classification, "value", classification): count
+            for classification, count in result.all()
+        }
         
-        # Por classificação
         for classification in ["quente", "morno", "frio"]:
-            result = await db.execute(
-                select(Lead).where(Lead.classification == classification)
-            )
-            count = len(result.scalars().all())
+            count = classification_counts.get(classification, 0)
             if count > 0:
                 emoji = "🔥" if classification == "quente" else "☀️" if classification == "morno" else "❄️"
-                print(f"{emoji} {classification.capitalize()}: {count}")
+                out.append(f"{emoji} {classification.capitalize()}: {count}")
         
         # Total de conversas
-        total_conv = await db.execute(select(Conversation))
-        conv_count = len(total_conv.scalars().all())
+        conv_count = await db.scalar(select(func.count()).select_from(Conversation))
         
         # Total de mensagens
-        total_msg = await db.execute(select(Message))
-        msg_count = len(total_msg.scalars().all())
+        msg_count = await db.scalar(select(func.count()).select_from(Message))
         
-        print(f"\n📈 Totais:")
-        print(f"   👥 Leads: {total}")
-        print(f"   💬 Conversas: {conv_count}")
-        print(f"   📝 Mensagens: {msg_count}")
-        print()
+        out.append(f"\n📈 Totais:")
+        out.append(f"   👥 Leads: {total}")
+        out.append(f"   💬 Conversas: {conv_count}")
+        out.append(f"   📝 Mensagens: {msg_count}")
+        out.append("")
+    
+    _write(out)
 
 
 async def main():
@@ -3,25 +3,43 @@ Aplicação FastAPI principal.
 Define rotas, middlewares e configurações globais.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from loguru import logger
 import time
 
 from src.core.config import get_settings
 from src.core.exceptions import BaseAppException
 from src.core.logging import setup_logging, log_request
+from src.core.security import rate_limiter
 from src.infrastructure.database.session import lifespan_db, check_db_connection
+from src.infrastructure.database.notifications import LeadChangeListener
+from src.infrastructure.ai.client import get_ai_client
+from src.infrastructure.messaging.whatsapp_client import create_http_client
+from src.domain.services.message_batcher import InboundMessageBatcher
+from src.domain.services.status_updater import MessageStatusUpdater
+from src.api.responses import AppJSONResponse
 from src.api.routes import webhooks, leads, conversations, health
 
 settings = get_settings()
 
+# Contador atômico por janela fixa no Redis (retorna a contagem da janela)
+RATE_LIMIT_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
 
 # ========================================
 # LIFESPAN (startup/shutdown)
@@ -40,10 +58,43 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Setup logging
     setup_logging()
     
+    # Cliente HTTP de saída compartilhado (reaproveita conexões TLS)
+    app.state.http = create_http_client()
+    
+    # Redis (rate limiting compartilhado entre workers)
+    app.state.redis = None
+    app.state.rate_limit_script = None
+    if settings.redis_url:
+        try:
+            import redis.asyncio as aioredis
+            
+            app.state.redis = aioredis.from_url(settings.redis_url)
+            app.state.rate_limit_script = app.state.redis.register_script(RATE_LIMIT_LUA)
+            logger.success("✅ Redis rate limiter enabled")
+        except ImportError:
+            logger.warning("redis not installed, using in-memory rate limiter")
+    
+    # Lotes de mensagens recebidas (processados fora do request do webhook)
+    app.state.message_batcher = InboundMessageBatcher(
+        http_client=app.state.http,
+        redis=app.state.redis
+    )
+    
+    # Status de mensagens enviadas (fila com consumidor único)
+    app.state.status_updater = MessageStatusUpdater()
+    
+    # Invalidação das estatísticas por alterações feitas fora da API
+    app.state.lead_listener = LeadChangeListener(redis=app.state.redis)
+    
     # Inicializa banco de dados
     async with lifespan_db():
+        app.state.status_updater.start()
+        await app.state.lead_listener.start()
         logger.success("✅ Database initialized")
         
+        # Aquecimento da IA em segundo plano (não atrasa o startup)
+        app.state.ai_warm_up = asyncio.create_task(get_ai_client().warm_up())
+        
         # Valida configurações críticas
         if not settings.whatsapp_access_token:
             logger.warning("⚠️  WhatsApp access token not configured")
@@ -53,10 +104,29 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         
         logger.success(f"✅ {settings.app_name} is ready!")
         
+        # Mensagem de boas-vindas no console
+        logger.info("=" * 60)
+        logger.info(f"  {settings.app_name} v{settings.app_version}")
+        logger.info(f"  Environment: {settings.environment}")
+        logger.info(f"  Listening on: http://{settings.api_host}:{settings.api_port}")
+        logger.info(f"  Docs: http://{settings.api_host}:{settings.api_port}/docs")
+        logger.info("=" * 60)
+        
         yield
+        
+        # Processa lotes e status pendentes antes de fechar o banco
+        await app.state.message_batcher.drain()
+        await app.state.status_updater.stop()
+        await app.state.lead_listener.stop()
     
     # ========== SHUTDOWN ==========
     logger.info("Shutting down application...")
+    
+    await app.state.http.aclose()
+    
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+    
     logger.success("👋 Goodbye!")
 
 
@@ -69,6 +139,7 @@ app = FastAPI(
     version=settings.app_version,
     description="Sistema inteligente de triagem de leads via WhatsApp",
     lifespan=lifespan,
+    default_response_class=AppJSONResponse,
     docs_url="/docs" if settings.is_development else None,
     redoc_url="/redoc" if settings.is_development else None,
     openapi_url="/openapi.json" if settings.is_development else None,
@@ -82,86 +153,130 @@ app = FastAPI(
 # CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.get_cors_origins(),
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 # Compressão GZIP
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """
+    GZip que pula os health checks: respostas minúsculas chamadas a cada
+    poucos segundos pelos probes, onde comprimir é puro overhead.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith("/health"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Abaixo de ~1 MTU a compressão não economiza pacotes
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1500)
 
 
-# Middleware de logging de requisições
-@app.middleware("http")
-async def log_requests_middleware(request: Request, call_next):
+# Middlewares ASGI puros: evitam a task extra e o wrapper anyio que o
+# @app.middleware("http") (BaseHTTPMiddleware) cria a cada requisição
+
+class TimingMiddleware:
     """Loga todas as requisições HTTP com tempo de processamento"""
     
-    start_time = time.time()
-    
-    # Processa requisição
-    response = await call_next(request)
-    
-    # Calcula duração
-    duration_ms = (time.time() - start_time) * 1000
-    
-    # Loga (skip health checks para não poluir logs)
-    if request.url.path != "/health":
-        log_request(
-            method=request.method,
-            path=request.url.path,
-            status_code=response.status_code,
-            duration_ms=duration_ms
-        )
-    
-    # Adiciona headers de timing
-    response.headers["X-Process-Time"] = f"{duration_ms:.2f}ms"
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    return response
-
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.monotonic_ns()
+        status_code = 500
+        duration_ms = 0.0
+        
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code, duration_ms
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                duration_ms = (time.monotonic_ns() - start) / 1_000_000
+                
+                # Adiciona headers de timing
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", f"{duration_ms:.2f}ms")
+            await send(message)
+        
+        await self.app(scope, receive, send_with_timing)
+        
+        # Loga (skip health checks para não poluir logs)
+        if scope["path"] != "/health":
+            log_request(
+                method=scope["method"],
+                path=scope["path"],
+                status_code=status_code,
+                duration_ms=duration_ms
+            )
 
-# Middleware de rate limiting (básico)
-# TODO: Implementar rate limiting robusto com Redis se necessário
-request_counts: dict[str, list[float]] = {}
 
-@app.middleware("http")
-async def simple_rate_limiter(request: Request, call_next):
-    """
-    Rate limiter simples baseado em IP.
-    Limite: 60 requisições por minuto por IP.
+class RateLimitMiddleware:
     """
+    Rate limiter baseado em IP (janela fixa de 60 segundos).
+    Limite: settings.rate_limit_per_minute requisições por minuto por IP.
     
-    # Apenas para endpoints não-críticos (skip webhooks)
-    if request.url.path.startswith("/webhooks"):
-        return await call_next(request)
-    
-    client_ip = request.client.host if request.client else "unknown"
-    current_time = time.time()
-    
-    # Limpa requests antigos (>1 minuto)
-    if client_ip in request_counts:
-        request_counts[client_ip] = [
-            t for t in request_counts[client_ip]
-            if current_time - t < 60
-        ]
-    else:
-        request_counts[client_ip] = []
-    
-    # Verifica limite
-    if len(request_counts[client_ip]) >= settings.rate_limit_per_minute:
-        logger.warning(f"Rate limit exceeded for {client_ip}")
-        return JSONResponse(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            content={
-                "error": "Rate limit exceeded",
-                "message": f"Maximum {settings.rate_limit_per_minute} requests per minute"
-            }
-        )
+    Usa Redis quando configurado (limite correto com múltiplos workers);
+    sem Redis, cai no RateLimiter em memória (janela fixa, desenvolvimento).
+    """
     
-    # Registra request
-    request_counts[client_ip].append(current_time)
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Apenas para endpoints não-críticos (skip webhooks)
+        if scope["type"] != "http" or scope["path"].startswith("/webhooks"):
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        script = getattr(scope["app"].state, "rate_limit_script", None)
+        
+        if script is not None:
+            try:
+                window_id = int(time.time() // 60)
+                count = await script(
+                    keys=[f"rl:{client_ip}:{window_id}"],
+                    args=[60_000]
+                )
+                allowed = count <= settings.rate_limit_per_minute
+            except Exception as e:
+                # Falha no Redis não deve derrubar a API (fail-open)
+                logger.warning(f"Redis rate limiter unavailable: {e}")
+                allowed = True
+        else:
+            allowed = rate_limiter.is_allowed(
+                client_ip,
+                max_requests=settings.rate_limit_per_minute,
+                window_seconds=60
+            )
+        
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for {client_ip}")
+            response = AppJSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={
+                    "error": "Rate limit exceeded",
+                    "message": f"Maximum {settings.rate_limit_per_minute} requests per minute"
+                }
+            )
+            await response(scope, receive, send)
+            return
+        
+        await self.app(scope, receive, send)
+
+
+# Ordem igual à anterior: o rate limiter é o mais externo (429 não é logado)
+app.add_middleware(TimingMiddleware)
+app.add_middleware(RateLimitMiddleware)
 
 
 # ========================================
@@ -174,7 +289,7 @@ async def app_exception_handler(request: Request, exc: BaseAppException):
     
     logger.error(f"Application error: {exc.message}", extra=exc.details)
     
-    return JSONResponse(
+    return AppJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.message,
@@ -197,7 +312,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     
     logger.warning(f"Validation error: {errors}")
     
-    return JSONResponse(
+    return AppJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "error": "Validation error",
@@ -214,7 +329,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     
     # Em produção, não expõe detalhes do erro
     if settings.is_production:
-        return JSONResponse(
+        return AppJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "error": "Internal server error",
@@ -223,7 +338,7 @@ async def global_exception_handler(request: Request, exc: Exception):
         )
     
     # Em desenvolvimento, mostra stack trace
-    return JSONResponse(
+    return AppJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "error": "Internal server error",
@@ -273,20 +388,5 @@ if settings.is_development:
         is_connected = await check_db_connection()
         return {
             "database_connected": is_connected,
-            "database_url": settings.database_url.split("@")[0] + "@***"
+            "database_url": settings.redacted_database_url
         }
-
-
-# ========================================
-# STARTUP MESSAGE
-# ========================================
-
-@app.on_event("startup")
-async def startup_message():
-    """Mensagem de boas-vindas no console"""
-    logger.info("=" * 60)
-    logger.info(f"  {settings.app_name} v{settings.app_version}")
-    logger.info(f"  Environment: {settings.environment}")
-    logger.info(f"  Listening on: http://{settings.api_host}:{settings.api_port}")
-    logger.info(f"  Docs: http://{settings.api_host}:{settings.api_port}/docs")
-    logger.info("=" * 60)
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Paginação por cursor (keyset) compartilhada entre as rotas.
+O cursor é opaco para o cliente e carrega a posição (created_at, id).
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, Tuple
+from uuid import UUID
+from fastapi import HTTPException
+
+
+def encode_cursor(row: Any) -> str:
+    """Cursor opaco com a posição (created_at, id) do último registro"""
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decodifica o cursor em (created_at, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, row_id = raw.split("|", 1)
+        UUID(row_id)  # o id vai para uma coluna uuid no PostgreSQL
+        return datetime.fromisoformat(created_at), row_id
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
@@ -0,0 +1,12 @@
+"""
+Parâmetros de rota compartilhados entre as rotas.
+"""
+
+from typing import Annotated
+from fastapi import Path
+
+# IDs são UUIDs (coluna uuid nativa no PostgreSQL): um valor malformado
+# nunca corresponde a um registro e é recusado aqui (422), sem ir ao banco
+UUID_PATTERN = r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+
+ResourceId = Annotated[str, Path(pattern=UUID_PATTERN)]
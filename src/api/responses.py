@@ -0,0 +1,20 @@
+"""
+Classe de resposta JSON padrão da API (orjson).
+"""
+
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+class AppJSONResponse(ORJSONResponse):
+    """
+    ORJSONResponse com datetimes sem fuso serializados como UTC
+    (o SQLite devolve datetimes naive) e chaves não-string permitidas.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        )
@@ -2,36 +2,98 @@
 Rotas para visualização de conversas e mensagens.
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
+import hashlib
+from typing import Any, AsyncIterator, List, Optional
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.orm import selectinload, noload
 
+from src.api.responses import AppJSONResponse
+from src.api.params import ResourceId
+from src.api.pagination import encode_cursor, decode_cursor
 from src.api.schemas.conversation import ConversationResponse
-from src.api.schemas.message import MessageResponse
+from src.api.schemas.message import MessageListResponse, MessageResponse
 from src.infrastructure.database.models import Conversation, Message, Lead
-from src.infrastructure.database.session import get_db
+from src.infrastructure.database.session import get_read_db, get_db_read_context
 from src.core.security import verify_api_key
 
 router = APIRouter()
 
+# Validadores compilados uma vez e reaproveitados a cada requisição
+_CONV_LIST = TypeAdapter(List[ConversationResponse])
+_MSG = TypeAdapter(MessageResponse)
+
+
+# ========================================
+# CONDITIONAL GET (ETag)
+# ========================================
+
+def _make_etag(request: Request, *version: Any) -> str:
+    """
+    ETag a partir da "versão" dos dados (max timestamps, contagens) e da query string.
+    blake2b é mais rápido que sha256 e está na stdlib.
+    """
+    raw = "|".join(map(str, (request.url.path, request.url.query, *version)))
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest() + '"'
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    """True se o cliente já possui a representação atual (If-None-Match)"""
+    return request.headers.get("if-none-match") == etag
+
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
-    conversation_id: str,
+    conversation_id: ResourceId,
+    request: Request,
+    response: Response,
     include_messages: bool = Query(True),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Busca conversa por ID, opcionalmente com todas as mensagens.
+    Suporta If-None-Match (responde 304 se nada mudou).
     """
     
+    # Versão da conversa: colunas que mudam a cada mensagem/transferência
+    version_result = await db.execute(
+        select(
+            Conversation.status,
+            Conversation.last_activity_at,
+            Conversation.ended_at,
+            Conversation.total_messages,
+            Conversation.data_collected_complete,
+            Conversation.transferred_to_human
+        ).where(Conversation.id == conversation_id)
+    )
+    version = version_result.one_or_none()
+    
+    if version is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    if include_messages:
+        messages_version = await db.execute(
+            select(func.max(Message.delivered_at), func.max(Message.sent_at))
+            .where(Message.conversation_id == conversation_id)
+        )
+        version = (*version, *messages_version.one())
+    
+    etag = _make_etag(request, *version)
+    if _is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
     query = select(Conversation).where(Conversation.id == conversation_id)
     
     if include_messages:
         query = query.options(selectinload(Conversation.messages))
+    else:
+        query = query.options(noload(Conversation.messages))
     
     result = await db.execute(query)
     conversation = result.scalar_one_or_none()
@@ -44,41 +106,122 @@ async def get_conversation(
 
 @router.get("/lead/{lead_id}", response_model=List[ConversationResponse])
 async def get_lead_conversations(
-    lead_id: str,
-    db: AsyncSession = Depends(get_db),
+    lead_id: ResourceId,
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
-    Lista todas as conversas de um lead específico.
+    Lista as conversas de um lead específico (mais recentes primeiro).
+    Suporta If-None-Match (responde 304 se nada mudou).
     """
     
+    version_result = await db.execute(
+        select(
+            func.count(Conversation.id),
+            func.max(Conversation.last_activity_at),
+            func.max(Conversation.ended_at)
+        ).where(Conversation.lead_id == lead_id)
+    )
+    etag = _make_etag(request, *version_result.one())
+    if _is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
     result = await db.execute(
         select(Conversation)
+        .options(noload(Conversation.messages))
         .where(Conversation.lead_id == lead_id)
         .order_by(Conversation.started_at.desc())
+        .offset(offset)
+        .limit(limit)
     )
     conversations = result.scalars().all()
     
-    return [ConversationResponse.model_validate(conv) for conv in conversations]
+    # Serializa direto (evita a revalidação do response_model pelo FastAPI)
+    return AppJSONResponse(
+        _CONV_LIST.dump_python(
+            _CONV_LIST.validate_python(conversations, from_attributes=True),
+            mode="json"
+        ),
+        headers={"ETag": etag}
+    )
 
 
-@router.get("/{conversation_id}/messages", response_model=List[MessageResponse])
+@router.get("/{conversation_id}/messages", response_model=MessageListResponse)
 async def get_conversation_messages(
-    conversation_id: str,
+    conversation_id: ResourceId,
+    request: Request,
     limit: int = Query(100, ge=1, le=500),
-    db: AsyncSession = Depends(get_db),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
-    Lista mensagens de uma conversa específica.
+    Lista mensagens de uma conversa específica (mais antigas primeiro).
+    
+    Para paginar, envie o `next_cursor` da resposta anterior em `cursor`.
+    `offset` continua disponível, mas o cursor usa o índice e não
+    precisa percorrer as páginas anteriores.
+    Suporta If-None-Match (responde 304 se nada mudou).
+    A resposta é enviada em streaming, sem materializar a lista inteira.
     """
     
-    result = await db.execute(
+    # Uma agregação sobre o índice (conversation_id, created_at)
+    version_result = await db.execute(
+        select(
+            func.count(Message.id),
+            func.max(Message.created_at),
+            func.max(Message.sent_at),
+            func.max(Message.delivered_at)
+        ).where(Message.conversation_id == conversation_id)
+    )
+    etag = _make_etag(request, *version_result.one())
+    if _is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    query = (
         select(Message)
         .where(Message.conversation_id == conversation_id)
-        .order_by(Message.created_at.asc())
-        .limit(limit)
+        .order_by(Message.created_at.asc(), Message.id.asc())
+    )
+    
+    if cursor:
+        query = query.where(
+            tuple_(Message.created_at, Message.id) > decode_cursor(cursor)
+        )
+    elif offset:
+        query = query.offset(offset)
+    
+    return StreamingResponse(
+        _stream_messages(query.limit(limit), limit),
+        media_type="application/json",
+        headers={"ETag": etag}
     )
-    messages = result.scalars().all()
+
+
+async def _stream_messages(query, limit: int) -> AsyncIterator[bytes]:
+    """
+    Serializa as mensagens linha a linha no formato de MessageListResponse.
+    
+    Usa sessão própria: dependências com yield do FastAPI fecham a sessão
+    antes do corpo do StreamingResponse ser enviado.
+    """
+    yield b'{"messages":['
+    
+    count = 0
+    last = None
+    async with get_db_read_context() as db:
+        result = await db.stream_scalars(query)
+        async for message in result:
+            if count:
+                yield b","
+            yield _MSG.dump_json(_MSG.validate_python(message, from_attributes=True))
+            count += 1
+            last = message
     
-    return [MessageResponse.model_validate(msg) for msg in messages]
\ No newline at end of file
+    # O cursor só é conhecido depois da última linha
+    next_cursor = encode_cursor(last) if count == limit else None
+    yield b'],"next_cursor":' + orjson.dumps(next_cursor) + b"}"
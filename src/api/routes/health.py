@@ -2,17 +2,61 @@
 Rotas de health check e status da aplicação.
 """
 
+import asyncio
+import time
 from datetime import datetime, UTC
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Depends
 from loguru import logger
 
 from src.api.schemas.responses import HealthCheckResponse
 from src.core.config import get_settings
-from src.infrastructure.database.session import check_db_connection
+from src.core.security import verify_api_key
+from src.infrastructure.database.session import check_db_connection, get_pool_stats
 
 settings = get_settings()
 router = APIRouter()
 
+# Configurações não mudam em runtime: calculadas uma vez no import
+AI_CONFIGURED = bool(settings.gemini_api_key)
+WHATSAPP_CONFIGURED = bool(settings.whatsapp_access_token)
+
+# Cache curto do probe de banco (probes do Kubernetes chegam a cada poucos segundos)
+DB_PROBE_TTL_SECONDS = 2.0
+
+_db_probe_result: bool = False
+_db_probe_checked_at: float = float("-inf")
+_db_probe_task: Optional[asyncio.Task] = None
+
+
+async def _run_db_probe() -> bool:
+    """Executa o SELECT 1 e atualiza o cache"""
+    global _db_probe_result, _db_probe_checked_at, _db_probe_task
+    
+    try:
+        _db_probe_result = await check_db_connection()
+        _db_probe_checked_at = time.monotonic()
+        return _db_probe_result
+    finally:
+        _db_probe_task = None
+
+
+async def cached_db_check() -> bool:
+    """
+    Verifica o banco com cache de DB_PROBE_TTL_SECONDS.
+    Requisições simultâneas com cache expirado compartilham o mesmo probe em andamento.
+    """
+    global _db_probe_task
+    
+    if time.monotonic() - _db_probe_checked_at < DB_PROBE_TTL_SECONDS:
+        return _db_probe_result
+    
+    if _db_probe_task is None:
+        _db_probe_task = asyncio.ensure_future(_run_db_probe())
+    
+    # shield: cancelar um cliente não cancela o probe dos demais
+    return await asyncio.shield(_db_probe_task)
+
 
 @router.get("", response_model=HealthCheckResponse)
 @router.get("/", response_model=HealthCheckResponse)
@@ -31,18 +75,18 @@ async def health_check():
     
     # 1. Banco de dados
     try:
-        checks["database"] = await check_db_connection()
+        checks["database"] = await cached_db_check()
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
         status = "unhealthy"
     
     # 2. IA Service (verifica se tem API key configurada)
-    checks["ai_service"] = bool(settings.gemini_api_key)
+    checks["ai_service"] = AI_CONFIGURED
     if not checks["ai_service"]:
         status = "degraded"
     
     # 3. WhatsApp (verifica se tem token configurado)
-    checks["whatsapp"] = bool(settings.whatsapp_access_token)
+    checks["whatsapp"] = WHATSAPP_CONFIGURED
     if not checks["whatsapp"]:
         status = "degraded"
     
@@ -56,6 +100,16 @@ async def health_check():
     )
 
 
+@router.get("/pool")
+async def pool_stats(api_key: str = Depends(verify_api_key)):
+    """
+    Estatísticas do pool de conexões do banco (requer API key: expõe
+    detalhes internos, ao contrário dos probes públicos).
+    checked_out próximo de size + max_overflow indica pool saturado.
+    """
+    return get_pool_stats()
+
+
 @router.get("/live")
 async def liveness():
     """
@@ -73,7 +127,7 @@ async def readiness():
     """
     
     # Verifica banco de dados
-    db_ok = await check_db_connection()
+    db_ok = await cached_db_check()
     
     if not db_ok:
         return {"status": "not ready", "reason": "database unavailable"}, 503
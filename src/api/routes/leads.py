@@ -3,21 +3,53 @@ Rotas de gerenciamento de leads.
 CRUD e listagem com filtros.
 """
 
-from typing import Optional, List
-from fastapi import APIRouter, Depends, Query, HTTPException
+import asyncio
+from typing import Any, Dict, Optional, List, Sequence
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, update, func, desc, tuple_
 from loguru import logger
 
+from src.api.responses import AppJSONResponse
+from src.api.params import ResourceId
+from src.api.pagination import encode_cursor, decode_cursor
 from src.api.schemas.lead import (
     LeadResponse, LeadListResponse, LeadUpdate, LeadStats
 )
 from src.infrastructure.database.models import Lead, LeadStatus, LeadClassification
-from src.infrastructure.database.session import get_db
+from src.infrastructure.database.session import get_db, get_read_db, get_db_read_context
+from src.infrastructure.cache.lead_stats import (
+    LeadSnapshot, load_lead_counters, rebuild_lead_counters, record_lead_change, lead_snapshot
+)
 from src.core.security import verify_api_key
 
 router = APIRouter()
 
+# Validador compilado uma vez e reaproveitado a cada requisição
+_LEAD_LIST = TypeAdapter(List[LeadResponse])
+
+# Apenas as colunas expostas em LeadResponse (sem extra_data, utm_*...)
+_LEAD_LIST_COLS = tuple(getattr(Lead, name) for name in LeadResponse.model_fields)
+
+
+async def _read_scalar(query) -> Any:
+    """Executa uma query escalar em sessão de leitura própria"""
+    async with get_db_read_context() as session:
+        return await session.scalar(query)
+
+
+async def _read_rows(query) -> Sequence[Any]:
+    """Executa uma query de colunas em sessão de leitura própria"""
+    async with get_db_read_context() as session:
+        result = await session.execute(query)
+        return result.all()
+
+
+def _escape_like(value: str) -> str:
+    """Escapa os curingas do LIKE (%, _) e o próprio caractere de escape"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
 
 @router.get("", response_model=LeadListResponse)
 async def list_leads(
@@ -26,105 +58,140 @@ async def list_leads(
     status: Optional[str] = None,
     classification: Optional[str] = None,
     city: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
     api_key: str = Depends(verify_api_key)
 ):
     """
     Lista leads com paginação e filtros.
     
+    Para paginação por cursor, envie o `next_cursor` da resposta anterior
+    em `cursor` (ignora `page` e não calcula `total`).
+    
     Filtros disponíveis:
     - status: novo, em_conversa, qualificado, desqualificado
     - classification: quente, morno, frio, nao_qualificado
     - city: nome da cidade
     """
     
-    # Base query
-    query = select(Lead)
+    # Filtros compartilhados entre a contagem e a página
+    filters = []
     
-    # Aplicar filtros
     if status:
-        query = query.where(Lead.status == status)
+        filters.append(Lead.status == status)
     
     if classification:
-        query = query.where(Lead.classification == classification)
+        filters.append(Lead.classification == classification)
     
+    city = city.strip() if city else None
     if city:
-        query = query.where(Lead.city.ilike(f"%{city}%"))
-    
-    # Total de registros (para paginação)
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-    
-    # Ordenar por criação (mais recentes primeiro)
-    query = query.order_by(desc(Lead.created_at))
-    
-    # Paginação
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size)
-    
-    # Executar
-    result = await db.execute(query)
-    leads = result.scalars().all()
-    
-    # Calcular total de páginas
-    total_pages = (total + page_size - 1) // page_size
+        # Servido pelo índice trigram idx_lead_city_trgm no PostgreSQL;
+        # curingas digitados pelo usuário são tratados como texto
+        filters.append(Lead.city.ilike(f"%{_escape_like(city)}%", escape="\\"))
+    
+    # Ordenar por criação (mais recentes primeiro); id desempata o cursor
+    query = (
+        select(*_LEAD_LIST_COLS)
+        .where(*filters)
+        .order_by(desc(Lead.created_at), desc(Lead.id))
+        .limit(page_size)
+    )
     
-    return LeadListResponse(
-        leads=[LeadResponse.model_validate(lead) for lead in leads],
-        total=total,
-        page=page,
-        page_size=page_size,
-        total_pages=total_pages
+    if cursor:
+        # Keyset: continua após o último lead visto, sem contagem
+        query = query.where(tuple_(Lead.created_at, Lead.id) < decode_cursor(cursor))
+        leads = await _read_rows(query)
+        total = total_pages = None
+    else:
+        # Total de registros (COUNT(*) sem subquery: com filtro de status ou
+        # classificação vira index-only scan no PostgreSQL)
+        count_query = select(func.count()).select_from(Lead).where(*filters)
+        query = query.offset((page - 1) * page_size)
+        
+        # Contagem e página em paralelo, cada uma na sua sessão
+        # (uma AsyncSession não aceita operações concorrentes)
+        total, leads = await asyncio.gather(
+            _read_scalar(count_query),
+            _read_rows(query)
+        )
+        
+        # Calcular total de páginas
+        total_pages = (total + page_size - 1) // page_size
+    
+    next_cursor = encode_cursor(leads[-1]) if len(leads) == page_size else None
+    
+    # Valida a página inteira de uma vez e serializa direto
+    # (evita a revalidação do response_model pelo FastAPI)
+    return AppJSONResponse(
+        LeadListResponse(
+            leads=_LEAD_LIST.validate_python(leads, from_attributes=True),
+            total=total,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages,
+            next_cursor=next_cursor
+        ).model_dump(mode="json")
     )
 
 
+async def _count_leads(db: AsyncSession) -> Dict[str, int]:
+    """Contadores calculados no banco, em uma única query (COUNT ... FILTER)"""
+    result = await db.execute(
+        select(
+            func.count(Lead.id).label("total"),
+            func.coalesce(func.sum(Lead.score), 0).label("score_sum"),
+            *(
+                func.count(Lead.id).filter(Lead.status == status).label(f"status:{status.value}")
+                for status in LeadStatus
+            ),
+            *(
+                func.count(Lead.id)
+                .filter(Lead.classification == classification)
+                .label(f"classification:{classification.value}")
+                for classification in LeadClassification
+            )
+        )
+    )
+    return dict(result.mappings().one())
+
+
 @router.get("/stats", response_model=LeadStats)
 async def get_lead_stats(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Retorna estatísticas agregadas de leads.
+    Com Redis configurado, lê os contadores mantidos por HINCRBY
+    (o banco só é consultado para reconstruí-los).
     """
     
-    # Total de leads
-    total_result = await db.execute(select(func.count(Lead.id)))
-    total = total_result.scalar()
+    redis = request.app.state.redis
     
-    # Por status
-    status_counts = {}
-    for status in LeadStatus:
-        result = await db.execute(
-            select(func.count(Lead.id)).where(Lead.status == status)
-        )
-        status_counts[status.value] = result.scalar()
+    counters = await load_lead_counters(redis)
+    if counters is None:
+        counters = await _count_leads(db)
+        await rebuild_lead_counters(redis, counters)
     
-    # Por classificação
-    classification_counts = {}
-    for classification in LeadClassification:
-        result = await db.execute(
-            select(func.count(Lead.id)).where(Lead.classification == classification)
-        )
-        classification_counts[classification.value] = result.scalar()
+    def count(prefix: str, enum_value: Any) -> int:
+        return counters.get(f"{prefix}:{enum_value.value}", 0)
     
-    # Score médio
-    avg_score_result = await db.execute(select(func.avg(Lead.score)))
-    avg_score = avg_score_result.scalar() or 0
+    total = counters.get("total", 0)
+    avg_score = counters.get("score_sum", 0) / total if total > 0 else 0
     
     # Taxa de conversão (qualificados / total)
-    qualified = status_counts.get("qualificado", 0)
+    qualified = count("status", LeadStatus.QUALIFIED)
     conversion_rate = (qualified / total * 100) if total > 0 else 0
     
     return LeadStats(
         total=total,
-        new=status_counts.get("novo", 0),
-        in_conversation=status_counts.get("em_conversa", 0),
+        new=count("status", LeadStatus.NEW),
+        in_conversation=count("status", LeadStatus.IN_CONVERSATION),
         qualified=qualified,
-        disqualified=status_counts.get("desqualificado", 0),
-        hot=classification_counts.get("quente", 0),
-        warm=classification_counts.get("morno", 0),
-        cold=classification_counts.get("frio", 0),
+        disqualified=count("status", LeadStatus.DISQUALIFIED),
+        hot=count("classification", LeadClassification.HOT),
+        warm=count("classification", LeadClassification.WARM),
+        cold=count("classification", LeadClassification.COLD),
         avg_score=round(avg_score, 2),
         conversion_rate=round(conversion_rate, 2)
     )
@@ -132,8 +199,8 @@ async def get_lead_stats(
 
 @router.get("/{lead_id}", response_model=LeadResponse)
 async def get_lead(
-    lead_id: str,
-    db: AsyncSession = Depends(get_db),
+    lead_id: ResourceId,
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -151,10 +218,25 @@ async def get_lead(
     return LeadResponse.model_validate(lead)
 
 
+async def _lock_counters_snapshot(db: AsyncSession, lead_id: str) -> Optional[LeadSnapshot]:
+    """
+    Estado atual do lead para os contadores do Redis, travando a linha até o
+    commit (FOR UPDATE no PostgreSQL) para que o delta aplicado seja exato.
+    """
+    result = await db.execute(
+        select(Lead.status, Lead.classification, Lead.score)
+        .where(Lead.id == lead_id)
+        .with_for_update()
+    )
+    row = result.one_or_none()
+    return lead_snapshot(*row) if row else None
+
+
 @router.patch("/{lead_id}", response_model=LeadResponse)
 async def update_lead(
-    lead_id: str,
+    lead_id: ResourceId,
     update_data: LeadUpdate,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     api_key: str = Depends(verify_api_key)
 ):
@@ -162,23 +244,30 @@ async def update_lead(
     Atualiza informações de um lead.
     """
     
-    # Busca lead
+    # Atualiza campos fornecidos (UPDATE ... RETURNING em um round-trip)
+    update_dict = update_data.model_dump(exclude_unset=True)
+    
+    redis = request.app.state.redis
+    before = await _lock_counters_snapshot(db, lead_id) if redis is not None else None
+    
     result = await db.execute(
-        select(Lead).where(Lead.id == lead_id)
+        update(Lead)
+        .where(Lead.id == lead_id)
+        .values(**update_dict)
+        .returning(Lead)
+        .execution_options(populate_existing=True)
     )
     lead = result.scalar_one_or_none()
     
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    # Atualiza campos fornecidos
-    update_dict = update_data.model_dump(exclude_unset=True)
-    
-    for field, value in update_dict.items():
-        setattr(lead, field, value)
-    
     await db.commit()
-    await db.refresh(lead)
+    
+    if before is not None:
+        await record_lead_change(
+            redis, before, lead_snapshot(lead.status, lead.classification, lead.score)
+        )
     
     logger.info(f"Lead {lead_id} updated: {update_dict}")
     
@@ -187,7 +276,8 @@ async def update_lead(
 
 @router.delete("/{lead_id}")
 async def delete_lead(
-    lead_id: str,
+    lead_id: ResourceId,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     api_key: str = Depends(verify_api_key)
 ):
@@ -195,18 +285,26 @@ async def delete_lead(
     Deleta um lead (soft delete - muda status para arquivado).
     """
     
+    redis = request.app.state.redis
+    before = await _lock_counters_snapshot(db, lead_id) if redis is not None else None
+    
+    # Soft delete
     result = await db.execute(
-        select(Lead).where(Lead.id == lead_id)
+        update(Lead)
+        .where(Lead.id == lead_id)
+        .values(status=LeadStatus.ARCHIVED)
+        .returning(Lead.classification, Lead.score)
     )
-    lead = result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not lead:
+    if row is None:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    # Soft delete
-    lead.status = LeadStatus.ARCHIVED
     await db.commit()
     
+    if before is not None:
+        await record_lead_change(redis, before, lead_snapshot(LeadStatus.ARCHIVED, *row))
+    
     logger.info(f"Lead {lead_id} archived")
     
     return {"success": True, "message": "Lead archived successfully"}
\ No newline at end of file
@@ -3,22 +3,51 @@ Rotas para webhooks do WhatsApp.
 Recebe notificações de mensagens recebidas, enviadas, entregues, etc.
 """
 
-from fastapi import APIRouter, Request, Response, Query, HTTPException, Depends, BackgroundTasks
+from typing import Any, Callable, Dict, List, Optional
+import orjson
+from fastapi import APIRouter, Request, Response, Query, HTTPException
 from fastapi.responses import PlainTextResponse
 from loguru import logger
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.api.schemas.webhook import WhatsAppWebhookPayload, WebhookVerification
 from src.core.config import get_settings
 from src.core.security import verify_whatsapp_signature
 from src.core.exceptions import InvalidWebhookSignatureError, WebhookValidationError
-from src.infrastructure.database.session import get_db
-from src.domain.services.message_processor import MessageProcessor
+from src.domain.services.message_processor import InboundMessage
 
 settings = get_settings()
 router = APIRouter()
 
 
+# ========================================
+# EXTRAÇÃO DE CONTEÚDO
+# ========================================
+
+def _extract_text(message_data: Dict[str, Any]) -> Optional[str]:
+    return message_data.get("text", {}).get("body")
+
+
+def _extract_button(message_data: Dict[str, Any]) -> Optional[str]:
+    return message_data.get("button", {}).get("text")
+
+
+def _extract_interactive(message_data: Dict[str, Any]) -> Optional[str]:
+    interactive = message_data.get("interactive", {})
+    if "button_reply" in interactive:
+        return interactive["button_reply"].get("title")
+    if "list_reply" in interactive:
+        return interactive["list_reply"].get("title")
+    return None
+
+
+# Tipo de mensagem do WhatsApp -> extrator do texto
+_CONTENT_EXTRACTORS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "text": _extract_text,
+    "button": _extract_button,
+    "interactive": _extract_interactive,
+}
+
+
 # ========================================
 # WEBHOOK VERIFICATION (GET)
 # ========================================
@@ -59,9 +88,7 @@ async def verify_webhook(
 
 @router.post("/whatsapp")
 async def receive_webhook(
-    request: Request,
-    background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db)
+    request: Request
 ) -> Response:
     """
     Recebe notificações de eventos do WhatsApp.
@@ -74,32 +101,48 @@ async def receive_webhook(
     caso contrário o WhatsApp considera como falha e para de enviar webhooks.
     """
     
+    # Corpo bruto lido uma única vez: usado no HMAC e no parse
+    raw_body = await request.body()
+    
     # ========== 1. VALIDAÇÃO DE ASSINATURA ==========
     try:
-        await verify_whatsapp_signature(request, settings.whatsapp_app_secret)
+        verify_whatsapp_signature(
+            raw_body,
+            request.headers.get("X-Hub-Signature-256"),
+            settings.whatsapp_app_secret.get_secret_value()
+        )
     except InvalidWebhookSignatureError:
         logger.error("Invalid webhook signature - possible security issue!")
         raise HTTPException(status_code=401, detail="Invalid signature")
     
     # ========== 2. PARSE PAYLOAD ==========
+    # A assinatura já autentica o payload como vindo da Meta: em produção
+    # percorremos o dict direto; a validação Pydantic completa fica no debug
     try:
-        body = await request.json()
-        payload = WhatsAppWebhookPayload(**body)
+        body = orjson.loads(raw_body)
+        if not isinstance(body, dict):
+            raise ValueError("Payload is not a JSON object")
+        if settings.debug:
+            WhatsAppWebhookPayload.model_validate(body)
     except Exception as e:
         logger.error(f"Failed to parse webhook payload: {e}")
         # Retorna 200 mesmo assim para não perder o webhook
         return Response(status_code=200)
     
     # ========== 3. PROCESSA CADA ENTRY ==========
-    for entry in payload.entry:
-        for change in entry.changes:
+    statuses: List[Dict[str, Any]] = []
+    overloaded = False
+    
+    for entry in body.get("entry", ()):
+        for change in entry.get("changes", ()):
             
             # Apenas processa mudanças no campo 'messages'
-            if change.field != "messages":
-                logger.debug(f"Ignoring change field: {change.field}")
+            field = change.get("field")
+            if field != "messages":
+                logger.debug(f"Ignoring change field: {field}")
                 continue
             
-            value = change.value
+            value = change.get("value") or {}
             
             # ========== 3.1 MENSAGENS RECEBIDAS ==========
             if "messages" in value:
@@ -112,135 +155,48 @@ async def receive_webhook(
                     timestamp = message_data.get("timestamp")
                     
                     # Extrai conteúdo baseado no tipo
-                    content = None
-                    if message_type == "text":
-                        content = message_data.get("text", {}).get("body")
-                    elif message_type == "button":
-                        content = message_data.get("button", {}).get("text")
-                    elif message_type == "interactive":
-                        interactive = message_data.get("interactive", {})
-                        if "button_reply" in interactive:
-                            content = interactive["button_reply"].get("title")
-                        elif "list_reply" in interactive:
-                            content = interactive["list_reply"].get("title")
+                    extractor = _CONTENT_EXTRACTORS.get(message_type)
+                    content = extractor(message_data) if extractor else None
                     
                     if not content:
                         logger.warning(f"Message without content: {message_type}")
                         continue
                     
-                    logger.info(
-                        f"📨 Received message from {phone_number}: "
-                        f"{content[:50]}{'...' if len(content) > 50 else ''}"
+                    # lazy: a prévia só é montada se o nível INFO estiver ativo
+                    logger.opt(lazy=True).info(
+                        "📨 Received message from {}: {}",
+                        lambda p=phone_number: p,
+                        lambda c=content: c[:50] + ("..." if c[50:51] else "")
                     )
                     
-                    # ========== PROCESSA EM BACKGROUND ==========
-                    # Não bloqueia o webhook (deve retornar 200 rápido!)
-                    background_tasks.add_task(
-                        process_incoming_message,
-                        db=db,
-                        phone_number=phone_number,
-                        message_id=message_id,
-                        content=content,
-                        message_type=message_type,
-                        timestamp=timestamp
+                    # ========== ENFILEIRA PARA PROCESSAMENTO ==========
+                    # Não bloqueia o webhook (deve retornar 200 rápido!).
+                    # Rajadas do mesmo número são agrupadas em um único lote.
+                    accepted = request.app.state.message_batcher.submit(
+                        phone_number,
+                        InboundMessage(
+                            whatsapp_message_id=message_id,
+                            content=content,
+                            message_type=message_type,
+                            timestamp=timestamp
+                        )
                     )
+                    if not accepted:
+                        overloaded = True
             
             # ========== 3.2 STATUS DE MENSAGENS ENVIADAS ==========
             if "statuses" in value:
-                for status_data in value["statuses"]:
-                    message_id = status_data.get("id")
-                    status = status_data.get("status")
-                    timestamp = status_data.get("timestamp")
-                    
-                    logger.debug(f"Message {message_id} status: {status}")
-                    
-                    # Atualiza status no banco em background
-                    background_tasks.add_task(
-                        update_message_status,
-                        db=db,
-                        message_id=message_id,
-                        status=status,
-                        timestamp=timestamp
-                    )
+                statuses.extend(value["statuses"])
+    
+    # Todos os status do payload em um único item da fila
+    if statuses and not request.app.state.status_updater.submit(statuses):
+        overloaded = True
+    
+    # Fila cheia: 503 faz o WhatsApp reenviar o webhook mais tarde
+    # (mensagens já aceitas são deduplicadas pelo whatsapp_message_id)
+    if overloaded:
+        return Response(status_code=503)
     
     # ========== 4. RETORNA 200 OK IMEDIATAMENTE ==========
     # CRÍTICO: WhatsApp espera resposta rápida
     return Response(status_code=200)
-
-
-# ========================================
-# BACKGROUND TASKS
-# ========================================
-
-async def process_incoming_message(
-    db: AsyncSession,
-    phone_number: str,
-    message_id: str,
-    content: str,
-    message_type: str,
-    timestamp: str
-) -> None:
-    """
-    Processa mensagem recebida em background (após retornar 200 ao WhatsApp).
-    
-    Fluxo:
-    1. Busca ou cria Lead
-    2. Busca ou cria Conversation
-    3. Salva Message no banco
-    4. Envia para IA processar
-    5. Gera resposta
-    6. Envia resposta
-    """
-    try:
-        processor = MessageProcessor(db)
-        
-        await processor.process_inbound_message(
-            phone_number=phone_number,
-            whatsapp_message_id=message_id,
-            content=content,
-            message_type=message_type,
-            timestamp=timestamp
-        )
-        
-        logger.success(f"✅ Message processed successfully: {message_id}")
-        
-    except Exception as e:
-        logger.exception(f"❌ Error processing message {message_id}: {e}")
-        # TODO: Implementar retry logic ou dead letter queue
-
-
-async def update_message_status(
-    db: AsyncSession,
-    message_id: str,
-    status: str,
-    timestamp: str
-) -> None:
-    """
-    Atualiza status de mensagem enviada (delivered, read, failed, etc).
-    
-    TODO: Implementar atualização de status quando precisar.
-    Por enquanto apenas logamos o evento.
-    """
-    try:
-        logger.info(f"Message {message_id} status: {status} at {timestamp}")
-        
-        # TODO: Buscar e atualizar mensagem no banco
-        # from sqlalchemy import select, update
-        # from src.infrastructure.database.models import Message
-        # from datetime import datetime
-        # 
-        # result = await db.execute(
-        #     select(Message).where(Message.whatsapp_message_id == message_id)
-        # )
-        # message = result.scalar_one_or_none()
-        # 
-        # if message:
-        #     ts = datetime.fromtimestamp(int(timestamp))
-        #     if status == "delivered":
-        #         message.delivered_at = ts
-        #     elif status == "read":
-        #         message.read_at = ts
-        #     await db.commit()
-        
-    except Exception as e:
-        logger.error(f"Error updating message status: {e}")
\ No newline at end of file
@@ -28,6 +28,7 @@ from src.api.schemas.lead import (
 from src.api.schemas.message import (
     MessageCreate,
     MessageResponse,
+    MessageListResponse,
     MessageDirectionEnum,
     MessageTypeEnum
 )
@@ -68,6 +69,7 @@ __all__ = [
     # Message
     "MessageCreate",
     "MessageResponse",
+    "MessageListResponse",
     "MessageDirectionEnum",
     "MessageTypeEnum",
     # Conversation
@@ -4,11 +4,13 @@ Estrutura de dados extraídos e resposta do modelo.
 """
 
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class AIExtractedData(BaseModel):
     """Dados extraídos pela IA da mensagem do usuário"""
+    model_config = ConfigDict(frozen=True)
+    
     nome: Optional[str] = None
     cidade: Optional[str] = None
     estado: Optional[str] = None
@@ -20,6 +22,9 @@ class AIExtractedData(BaseModel):
 
 class AIResponse(BaseModel):
     """Resposta estruturada da IA"""
+    # Imutável: as respostas de fallback são instâncias compartilhadas
+    model_config = ConfigDict(frozen=True)
+    
     response_text: str = Field(..., min_length=1)
     extracted_data: AIExtractedData
     intent: str = Field(
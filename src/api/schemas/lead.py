@@ -2,36 +2,43 @@
 Schemas para Lead (CRUD e listagem).
 """
 
+import re
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field, field_validator, ConfigDict
-from enum import Enum
+
+from src.infrastructure.database.models import LeadStatus, LeadClassification
 
 
 # ========================================
 # ENUMS
 # ========================================
 
-class LeadStatusEnum(str, Enum):
-    NEW = "novo"
-    IN_CONVERSATION = "em_conversa"
-    QUALIFIED = "qualificado"
-    DISQUALIFIED = "desqualificado"
-    TRANSFERRED = "transferido"
-    ARCHIVED = "arquivado"
-
-
-class LeadClassificationEnum(str, Enum):
-    HOT = "quente"
-    WARM = "morno"
-    COLD = "frio"
-    UNQUALIFIED = "nao_qualificado"
+# Mesmas classes do modelo: valores do banco validam sem conversão
+LeadStatusEnum = LeadStatus
+LeadClassificationEnum = LeadClassification
 
 
 # ========================================
 # BASE SCHEMAS
 # ========================================
 
+_NON_DIGIT = re.compile(r"\D")
+
+
+def _normalize_email(v: Optional[str]) -> Optional[str]:
+    """
+    Email sem espaços e em minúsculas: gravado já normalizado, a busca
+    por email é uma igualdade simples (usa índice, sem lower() por linha)
+    """
+    if not v:
+        return v
+    v = v.strip().lower()
+    if "@" not in v:
+        raise ValueError("Invalid email format")
+    return v
+
+
 class LeadBase(BaseModel):
     """Campos comuns de Lead"""
     phone_number: str = Field(..., min_length=10, max_length=20)
@@ -50,7 +57,7 @@ class LeadBase(BaseModel):
     @classmethod
     def validate_phone(cls, v: str) -> str:
         """Remove caracteres não numéricos do telefone"""
-        cleaned = "".join(filter(str.isdigit, v))
+        cleaned = _NON_DIGIT.sub("", v)
         if len(cleaned) < 10:
             raise ValueError("Phone number too short")
         return cleaned
@@ -58,10 +65,8 @@ class LeadBase(BaseModel):
     @field_validator("email")
     @classmethod
     def validate_email(cls, v: Optional[str]) -> Optional[str]:
-        """Validação básica de email"""
-        if v and "@" not in v:
-            raise ValueError("Invalid email format")
-        return v
+        """Validação básica de email (normalizado, ver _normalize_email)"""
+        return _normalize_email(v)
 
 
 class LeadCreate(LeadBase):
@@ -83,6 +88,12 @@ class LeadUpdate(BaseModel):
     status: Optional[LeadStatusEnum] = None
     routed_to: Optional[str] = None
     extra_data: Optional[Dict[str, Any]] = None
+    
+    @field_validator("email")
+    @classmethod
+    def validate_email(cls, v: Optional[str]) -> Optional[str]:
+        """Validação básica de email (normalizado, ver _normalize_email)"""
+        return _normalize_email(v)
 
 
 class LeadResponse(LeadBase):
@@ -102,12 +113,16 @@ class LeadResponse(LeadBase):
 
 
 class LeadListResponse(BaseModel):
-    """Lista paginada de leads"""
+    """
+    Lista paginada de leads.
+    No modo cursor, total e total_pages não são calculados (None).
+    """
     leads: List[LeadResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 # ========================================
@@ -3,7 +3,7 @@ Schemas para Message (mensagens da conversa).
 """
 
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field, ConfigDict
 from enum import Enum
 
@@ -57,4 +57,9 @@ class MessageResponse(MessageBase):
     delivered_at: Optional[datetime] = None
     created_at: datetime
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class MessageListResponse(BaseModel):
+    """Página de mensagens (paginação por cursor)"""
+    messages: List[MessageResponse]
+    next_cursor: Optional[str] = None
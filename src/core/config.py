@@ -3,12 +3,23 @@ Configurações centralizadas do sistema usando Pydantic Settings.
 Todas as variáveis de ambiente são carregadas e validadas aqui.
 """
 
-from functools import lru_cache
-from typing import List, Optional
-from pydantic import Field, field_validator
+import os
+import unicodedata
+from functools import cache, cached_property, lru_cache
+from typing import FrozenSet, List, Optional, Tuple
+from pydantic import Field, SecretStr, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+@lru_cache(maxsize=1024)
+def normalize_city_name(city: str) -> str:
+    """
+    Nome da cidade sem acentos e em casefold ("São Paulo" -> "sao paulo").
+    Memoizada: a mesma cidade chega da IA e do lead a cada mensagem.
+    """
+    return unicodedata.normalize("NFKD", city.strip()).encode("ascii", "ignore").decode().casefold()
+
+
 class Settings(BaseSettings):
     """Configurações globais da aplicação"""
     
@@ -34,13 +45,14 @@ class Settings(BaseSettings):
     api_host: str = Field(default="0.0.0.0")
     api_port: int = Field(default=8000)
     api_reload: bool = Field(default=True)
+    web_concurrency: Optional[int] = Field(default=None, ge=1)  # workers do uvicorn
     allowed_origins: str = Field(default="*")
     
-    secret_key: str = Field(
+    secret_key: SecretStr = Field(
         default="change-me-in-production-min-32-characters",
         min_length=32
     )
-    admin_api_key: str = Field(default="admin-key-change-me")
+    admin_api_key: SecretStr = Field(default="admin-key-change-me")
     
     # ========================================
     # BANCO DE DADOS
@@ -48,9 +60,21 @@ class Settings(BaseSettings):
     database_url: str = Field(
         default="sqlite+aiosqlite:///./dental_triage.db"
     )
-    db_pool_size: int = Field(default=5)
-    db_max_overflow: int = Field(default=10)
+    # Conexões do PostgreSQL somadas entre todos os workers (o padrão do
+    # servidor é max_connections=100; sobra folga para scripts e psql).
+    # Por worker: orçamento // workers, menos a conexão LISTEN, metade
+    # fixa no pool e metade em overflow (ver db_pool_limits)
+    db_max_connections: int = Field(default=90, ge=1)
+    db_pool_size: Optional[int] = Field(default=None, ge=1)  # sobrescreve o cálculo
+    db_max_overflow: Optional[int] = Field(default=None, ge=0)
+    db_pool_timeout: int = Field(default=5)  # segundos aguardando conexão livre
+    db_pool_pre_ping: bool = Field(default=False)  # valida conexões no checkout (PostgreSQL)
+    db_statement_cache_size: int = Field(default=1024, ge=0)  # prepared statements por conexão (PostgreSQL)
     db_echo: bool = Field(default=False)
+    # application_name das conexões PostgreSQL: o trigger leads_changed só
+    # ignora o da API ("triagem-api"); scripts que alteram leads usam outro
+    # nome para o NOTIFY invalidar as estatísticas dos workers
+    db_application_name: str = Field(default="triagem-api")
     
     @field_validator("database_url")
     @classmethod
@@ -66,31 +90,41 @@ class Settings(BaseSettings):
     whatsapp_api_version: str = Field(default="v18.0")
     whatsapp_phone_number_id: str = Field(default="")
     whatsapp_business_account_id: str = Field(default="")
-    whatsapp_access_token: str = Field(default="")
-    whatsapp_app_secret: str = Field(default="")
+    whatsapp_access_token: SecretStr = Field(default="")
+    whatsapp_app_secret: SecretStr = Field(default="")
     whatsapp_verify_token: str = Field(default="my-verify-token-12345")
     whatsapp_webhook_path: str = Field(default="/webhooks/whatsapp")
     
-    @property
+    @cached_property
+    def worker_count(self) -> int:
+        """Workers do servidor: WEB_CONCURRENCY ou 2 * CPUs + 1"""
+        return self.web_concurrency or (os.cpu_count() or 1) * 2 + 1
+    
+    @cached_property
+    def db_pool_limits(self) -> Tuple[int, int]:
+        """
+        (pool_size, max_overflow) de cada worker no PostgreSQL. Ex.: 8 CPUs
+        -> 17 workers -> 90 // 17 - 1 = 4 conexões -> (2, 2), 85 no total
+        """
+        budget = max(2, self.db_max_connections // self.worker_count - 1)
+        pool_size = self.db_pool_size or max(1, budget // 2)
+        max_overflow = self.db_max_overflow if self.db_max_overflow is not None else max(0, budget - pool_size)
+        return pool_size, max_overflow
+    
+    @cached_property
     def whatsapp_api_url(self) -> str:
-        """URL base da API do WhatsApp"""
+        """URL base da API do WhatsApp (calculada uma vez)"""
         return f"https://graph.facebook.com/{self.whatsapp_api_version}"
     
-    @property
+    @cached_property
     def whatsapp_send_message_url(self) -> str:
-        """Endpoint para enviar mensagens"""
+        """Endpoint para enviar mensagens (calculado uma vez)"""
         return f"{self.whatsapp_api_url}/{self.whatsapp_phone_number_id}/messages"
     
     # ========================================
     # IA (GEMINI - ÚNICO PROVEDOR)
     # ========================================
-    gemini_api_key: str = Field(default="")
-    gemini_model: str = Field(default="gemini-1.5-flash")
-    
-    # ========================================
-    # IA (GEMINI - NOVO)
-    # ========================================
-    gemini_api_key: str = Field(default="")
+    gemini_api_key: SecretStr = Field(default="")
     gemini_model: str = Field(default="gemini-1.5-flash")
     
     # ========================================
@@ -100,6 +134,16 @@ class Settings(BaseSettings):
     ai_temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     ai_timeout_seconds: int = Field(default=15)
     ai_max_retries: int = Field(default=3)
+    ai_max_concurrency: int = Field(default=10, ge=1)  # chamadas simultâneas ao Gemini por worker
+    # Hedge: se o Gemini não responder em N ms, dispara uma segunda chamada
+    # e usa a primeira que voltar (0 = desativado; dobra o consumo de cota)
+    ai_hedge_ms: int = Field(default=0, ge=0)
+    
+    # Cache semântico (mensagens parecidas no mesmo estado do lead);
+    # requer sentence-transformers instalado
+    ai_semantic_cache_enabled: bool = Field(default=False)
+    ai_semantic_cache_model: str = Field(default="paraphrase-multilingual-MiniLM-L12-v2")
+    ai_semantic_cache_threshold: float = Field(default=0.92, ge=0.0, le=1.0)
     
     # ========================================
     # LÓGICA DE NEGÓCIO
@@ -108,10 +152,19 @@ class Settings(BaseSettings):
         default="Juiz de Fora, Rio de Janeiro, São Paulo"
     )
     
-    @property
-    def covered_cities_list(self) -> List[str]:
-        """Lista de cidades atendidas"""
-        return [city.strip() for city in self.covered_cities.split(",")]
+    @cached_property
+    def covered_cities_list(self) -> Tuple[str, ...]:
+        """Cidades atendidas, na ordem configurada (calculada uma vez)"""
+        return tuple(city.strip() for city in self.covered_cities.split(","))
+    
+    @cached_property
+    def covered_cities_set(self) -> FrozenSet[str]:
+        """Cidades atendidas normalizadas (ver normalize_city_name)"""
+        return frozenset(normalize_city_name(city) for city in self.covered_cities_list)
+    
+    def is_covered_city(self, city: str) -> bool:
+        """Verifica se a cidade é atendida, ignorando acentos e maiúsculas"""
+        return normalize_city_name(city) in self.covered_cities_set
     
     score_threshold_hot: int = Field(default=70, ge=0, le=100)
     score_threshold_warm: int = Field(default=40, ge=0, le=100)
@@ -125,7 +178,7 @@ class Settings(BaseSettings):
     smtp_host: Optional[str] = Field(default=None)
     smtp_port: int = Field(default=587)
     smtp_user: Optional[str] = Field(default=None)
-    smtp_password: Optional[str] = Field(default=None)
+    smtp_password: Optional[SecretStr] = Field(default=None)
     smtp_from: Optional[str] = Field(default=None)
     
     notify_on_qualified_lead: bool = Field(default=False)
@@ -134,7 +187,7 @@ class Settings(BaseSettings):
     # ========================================
     # MONITORAMENTO
     # ========================================
-    sentry_dsn: Optional[str] = Field(default=None)
+    sentry_dsn: Optional[SecretStr] = Field(default=None)
     sentry_traces_sample_rate: float = Field(default=0.1, ge=0.0, le=1.0)
     
     # ========================================
@@ -143,6 +196,11 @@ class Settings(BaseSettings):
     rate_limit_per_minute: int = Field(default=60)
     rate_limit_per_hour: int = Field(default=1000)
     
+    # ========================================
+    # REDIS (estado compartilhado entre workers)
+    # ========================================
+    redis_url: Optional[str] = Field(default=None)
+    
     # ========================================
     # FEATURES
     # ========================================
@@ -154,14 +212,14 @@ class Settings(BaseSettings):
     # MÉTODOS AUXILIARES
     # ========================================
     
-    @property
+    @cached_property
     def is_development(self) -> bool:
-        """Verifica se está em modo desenvolvimento"""
+        """Verifica se está em modo desenvolvimento (calculado uma vez)"""
         return self.environment.lower() in ("development", "dev", "local")
     
-    @property
+    @cached_property
     def is_production(self) -> bool:
-        """Verifica se está em modo produção"""
+        """Verifica se está em modo produção (calculado uma vez)"""
         return self.environment.lower() in ("production", "prod")
     
     # ========================================
@@ -170,8 +228,8 @@ class Settings(BaseSettings):
 
     @property
     def ai_api_key(self) -> str:
-        """Retorna a chave da IA"""
-        return self.gemini_api_key
+        """Retorna a chave da IA (texto puro)"""
+        return self.gemini_api_key.get_secret_value()
 
     @property
     def ai_provider(self) -> str:
@@ -188,37 +246,46 @@ class Settings(BaseSettings):
         """Retorna o modelo da IA"""
         return self.gemini_model
 
-    def get_cors_origins(self) -> List[str]:
-        """Retorna lista de origens permitidas para CORS"""
+    @cached_property
+    def cors_origins(self) -> List[str]:
+        """Lista de origens permitidas para CORS (calculada uma vez)"""
         if self.allowed_origins == "*":
             return ["*"]
         return [origin.strip() for origin in self.allowed_origins.split(",")]
 
+    def get_cors_origins(self) -> List[str]:
+        """Retorna lista de origens permitidas para CORS"""
+        return self.cors_origins
+
+    @cached_property
+    def redacted_database_url(self) -> str:
+        """URL do banco sem credenciais (para logs e debug)"""
+        return self.database_url.split("@")[0] + "@***"
+
     def model_dump_safe(self) -> dict:
-        """Retorna configurações sem dados sensíveis"""
-        data = self.model_dump()
-        sensitive_keys = [
-            "secret_key", "admin_api_key", "whatsapp_access_token",
-            "whatsapp_app_secret", "gemini_api_key", 
-            "smtp_password", "sentry_dsn", "database_url"
-        ]
-        for key in sensitive_keys:
-            if key in data and data[key]:
-                data[key] = "***HIDDEN***"
+        """
+        Retorna configurações sem dados sensíveis.
+        Campos SecretStr já saem mascarados; as URLs de conexão (que podem
+        conter usuário e senha) são redigidas aqui.
+        """
+        data = self.model_dump(mode="json")
+        data["database_url"] = self.redacted_database_url
+        if self.redis_url:
+            data["redis_url"] = "***HIDDEN***"
         return data
 
 
-@lru_cache
+@cache
 def get_settings() -> Settings:
     """
     Retorna instância única de Settings (Singleton).
-    Usa LRU cache para evitar recarregar .env múltiplas vezes.
+    Usa cache para evitar recarregar .env múltiplas vezes.
     """
     return Settings()
 
 
 # Instância global (opcional, para conveniência)
-settings = get_settings()
+settings: Settings = get_settings()
 
 
 # Validação ao importar (fail-fast)
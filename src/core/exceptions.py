@@ -7,7 +7,14 @@ from typing import Optional, Any
 
 
 class BaseAppException(Exception):
-    """Exceção base da aplicação"""
+    """
+    Exceção base da aplicação.
+    
+    Atributos em __slots__ (e __slots__ = () nas subclasses): leitura via
+    descritor em vez do __dict__ da instância.
+    """
+    
+    __slots__ = ("message", "status_code", "details")
     
     def __init__(
         self,
@@ -28,6 +35,8 @@ class BaseAppException(Exception):
 class ValidationError(BaseAppException):
     """Erro de validação de dados"""
     
+    __slots__ = ()
+    
     def __init__(self, message: str, field: Optional[str] = None, **kwargs: Any):
         details = {"field": field} if field else {}
         details.update(kwargs)
@@ -37,6 +46,8 @@ class ValidationError(BaseAppException):
 class InvalidPhoneNumberError(ValidationError):
     """Número de telefone inválido"""
     
+    __slots__ = ()
+    
     def __init__(self, phone: str):
         super().__init__(
             message=f"Número de telefone inválido: {phone}",
@@ -47,6 +58,8 @@ class InvalidPhoneNumberError(ValidationError):
 class UnsupportedCityError(ValidationError):
     """Cidade não atendida"""
     
+    __slots__ = ()
+    
     def __init__(self, city: str):
         super().__init__(
             message=f"Cidade não atendida: {city}",
@@ -61,6 +74,8 @@ class UnsupportedCityError(ValidationError):
 class WhatsAppError(BaseAppException):
     """Erro relacionado ao WhatsApp"""
     
+    __slots__ = ()
+    
     def __init__(self, message: str, **kwargs: Any):
         super().__init__(message, status_code=502, details=kwargs)
 
@@ -68,6 +83,8 @@ class WhatsAppError(BaseAppException):
 class InvalidWebhookSignatureError(WhatsAppError):
     """Assinatura de webhook inválida"""
     
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__(
             message="Invalid webhook signature",
@@ -78,6 +95,8 @@ class InvalidWebhookSignatureError(WhatsAppError):
 class MessageSendError(WhatsAppError):
     """Erro ao enviar mensagem"""
     
+    __slots__ = ()
+    
     def __init__(self, phone: str, reason: str):
         super().__init__(
             message=f"Failed to send message to {phone}: {reason}",
@@ -89,6 +108,8 @@ class MessageSendError(WhatsAppError):
 class WebhookValidationError(WhatsAppError):
     """Erro na validação do webhook"""
     
+    __slots__ = ()
+    
     def __init__(self, reason: str):
         super().__init__(
             message=f"Webhook validation failed: {reason}",
@@ -104,6 +125,8 @@ class WebhookValidationError(WhatsAppError):
 class AIError(BaseAppException):
     """Erro relacionado ao processamento de IA"""
     
+    __slots__ = ()
+    
     def __init__(self, message: str, model: Optional[str] = None, **kwargs: Any):
         details = {"model": model} if model else {}
         details.update(kwargs)
@@ -113,6 +136,8 @@ class AIError(BaseAppException):
 class AITimeoutError(AIError):
     """Timeout na chamada da IA"""
     
+    __slots__ = ()
+    
     def __init__(self, model: str, timeout: int):
         super().__init__(
             message=f"AI request timeout after {timeout}s",
@@ -124,6 +149,8 @@ class AITimeoutError(AIError):
 class AIResponseParseError(AIError):
     """Erro ao fazer parse da resposta da IA"""
     
+    __slots__ = ()
+    
     def __init__(self, model: str, raw_response: str):
         super().__init__(
             message="Failed to parse AI response as JSON",
@@ -135,6 +162,8 @@ class AIResponseParseError(AIError):
 class AIQuotaExceededError(AIError):
     """Cota de API da IA excedida"""
     
+    __slots__ = ()
+    
     def __init__(self, model: str):
         super().__init__(
             message=f"API quota exceeded for {model}",
@@ -150,6 +179,8 @@ class AIQuotaExceededError(AIError):
 class DatabaseError(BaseAppException):
     """Erro relacionado ao banco de dados"""
     
+    __slots__ = ()
+    
     def __init__(self, message: str, **kwargs: Any):
         super().__init__(message, status_code=500, details=kwargs)
 
@@ -157,6 +188,8 @@ class DatabaseError(BaseAppException):
 class LeadNotFoundError(DatabaseError):
     """Lead não encontrado"""
     
+    __slots__ = ()
+    
     def __init__(self, identifier: str):
         super().__init__(
             message=f"Lead not found: {identifier}",
@@ -168,6 +201,8 @@ class LeadNotFoundError(DatabaseError):
 class ConversationNotFoundError(DatabaseError):
     """Conversa não encontrada"""
     
+    __slots__ = ()
+    
     def __init__(self, conversation_id: str):
         super().__init__(
             message=f"Conversation not found: {conversation_id}",
@@ -179,6 +214,8 @@ class ConversationNotFoundError(DatabaseError):
 class DuplicateLeadError(DatabaseError):
     """Lead duplicado (phone já existe)"""
     
+    __slots__ = ()
+    
     def __init__(self, phone: str):
         super().__init__(
             message=f"Lead already exists with phone: {phone}",
@@ -194,6 +231,8 @@ class DuplicateLeadError(DatabaseError):
 class AuthenticationError(BaseAppException):
     """Erro de autenticação"""
     
+    __slots__ = ()
+    
     def __init__(self, message: str = "Authentication failed"):
         super().__init__(message, status_code=401)
 
@@ -201,6 +240,8 @@ class AuthenticationError(BaseAppException):
 class InvalidAPIKeyError(AuthenticationError):
     """API Key inválida"""
     
+    __slots__ = ()
+    
     def __init__(self):
         super().__init__(message="Invalid or missing API key")
 
@@ -212,6 +253,8 @@ class InvalidAPIKeyError(AuthenticationError):
 class BusinessRuleError(BaseAppException):
     """Erro de regra de negócio"""
     
+    __slots__ = ()
+    
     def __init__(self, message: str, **kwargs: Any):
         super().__init__(message, status_code=400, details=kwargs)
 
@@ -219,6 +262,8 @@ class BusinessRuleError(BaseAppException):
 class SessionExpiredError(BusinessRuleError):
     """Sessão de conversa expirada"""
     
+    __slots__ = ()
+    
     def __init__(self, phone: str):
         super().__init__(
             message=f"Conversation session expired for {phone}",
@@ -229,6 +274,8 @@ class SessionExpiredError(BusinessRuleError):
 class MaxMessagesExceededError(BusinessRuleError):
     """Limite de mensagens atingido"""
     
+    __slots__ = ()
+    
     def __init__(self, phone: str, limit: int):
         super().__init__(
             message=f"Max messages ({limit}) exceeded for {phone}",
@@ -244,6 +291,8 @@ class MaxMessagesExceededError(BusinessRuleError):
 class RateLimitExceededError(BaseAppException):
     """Rate limit excedido"""
     
+    __slots__ = ()
+    
     def __init__(self, identifier: str, limit: int, window: str):
         super().__init__(
             message=f"Rate limit exceeded: {limit} requests per {window}",
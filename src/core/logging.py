@@ -5,13 +5,50 @@ Configuração de logs estruturados, rotação e integração com Sentry.
 
 import sys
 import logging
+import shutil
+import subprocess
 from pathlib import Path
 from typing import Optional
 from loguru import logger
 
-from src.core.config import get_settings
+from src.core.config import settings
 
-settings = get_settings()
+# zstd (se instalado) comprime arquivos rotacionados em processo separado
+ZSTD_PATH = shutil.which("zstd")
+
+
+def _compress_rotated_log(path: str) -> None:
+    """
+    Compressão do arquivo rotacionado sem bloquear a thread do sink:
+    o zstd roda em segundo plano e remove o original ao terminar.
+    """
+    subprocess.Popen(
+        [ZSTD_PATH, "--rm", "-q", path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+# Níveis da biblioteca padrão que existem com o mesmo nome no loguru
+_LOGURU_LEVELS = frozenset(("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"))
+_LOGGING_FILE = logging.__file__
+
+
+class InterceptHandler(logging.Handler):
+    """Redireciona logs da biblioteca padrão (uvicorn, sqlalchemy, httpx) para o loguru"""
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        level = record.levelname if record.levelname in _LOGURU_LEVELS else record.levelno
+        
+        # Sobe até o primeiro frame fora do módulo logging (quem chamou o log)
+        frame, depth = sys._getframe(1), 1
+        while frame and frame.f_code.co_filename == _LOGGING_FILE:
+            frame = frame.f_back
+            depth += 1
+        
+        logger.opt(depth=depth, exception=record.exc_info).log(
+            level, record.getMessage()
+        )
 
 
 def setup_logging(
@@ -80,7 +117,7 @@ def setup_logging(
             level=level,
             rotation="100 MB",
             retention="30 days",
-            compression="zip",
+            compression=_compress_rotated_log if ZSTD_PATH else "zip",
             enqueue=True,
             backtrace=True,
             diagnose=False
@@ -89,22 +126,6 @@ def setup_logging(
     # ========================================
     # INTEGRAÇÃO COM LOGGING PADRÃO
     # ========================================
-    class InterceptHandler(logging.Handler):
-        def emit(self, record: logging.LogRecord) -> None:
-            try:
-                level = logger.level(record.levelname).name
-            except ValueError:
-                level = record.levelno
-            
-            frame, depth = logging.currentframe(), 2
-            while frame and frame.f_code.co_filename == logging.__file__:
-                frame = frame.f_back
-                depth += 1
-            
-            logger.opt(depth=depth, exception=record.exc_info).log(
-                level, record.getMessage()
-            )
-    
     logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
     
     for logger_name in ["uvicorn", "uvicorn.access", "sqlalchemy", "httpx"]:
@@ -126,7 +147,7 @@ def setup_logging(
             )
             
             sentry_sdk.init(
-                dsn=settings.sentry_dsn,
+                dsn=settings.sentry_dsn.get_secret_value(),
                 environment=settings.environment,
                 release=settings.app_version,
                 traces_sample_rate=settings.sentry_traces_sample_rate,
@@ -143,21 +164,27 @@ def setup_logging(
     )
 
 
+# Os campos estruturados vão como kwargs do próprio log: o loguru os usa na
+# mensagem e os guarda em record["extra"], sem criar um logger com bind()
+# a cada chamada; nada é formatado se o nível estiver desativado.
+
 def log_request(method: str, path: str, status_code: int, duration_ms: float) -> None:
     """Loga requisição HTTP de forma estruturada."""
-    log_data = {
-        "method": method,
-        "path": path,
-        "status": status_code,
-        "duration_ms": round(duration_ms, 2)
-    }
-    
     if status_code < 400:
-        logger.bind(**log_data).info(f"{method} {path} - {status_code}")
+        level = "INFO"
     elif status_code < 500:
-        logger.bind(**log_data).warning(f"{method} {path} - {status_code}")
+        level = "WARNING"
     else:
-        logger.bind(**log_data).error(f"{method} {path} - {status_code}")
+        level = "ERROR"
+    
+    logger.log(
+        level,
+        "{method} {path} - {status}",
+        method=method,
+        path=path,
+        status=status_code,
+        duration_ms=round(duration_ms, 2)
+    )
 
 
 def log_ai_call(
@@ -168,20 +195,23 @@ def log_ai_call(
     error: Optional[str] = None
 ) -> None:
     """Loga chamada para IA de forma estruturada."""
-    log_data = {
-        "model": model,
-        "tokens": tokens_used,
-        "duration_ms": round(duration_ms, 2),
-        "success": success
-    }
-    
     if success:
-        logger.bind(**log_data).info(
-            f"AI call successful: {model} ({tokens_used} tokens, {duration_ms:.0f}ms)"
+        logger.info(
+            "AI call successful: {model} ({tokens} tokens, {duration_ms:.0f}ms)",
+            model=model,
+            tokens=tokens_used,
+            duration_ms=round(duration_ms, 2),
+            success=success
         )
     else:
-        log_data["error"] = error
-        logger.bind(**log_data).error(f"AI call failed: {model} - {error}")
+        logger.error(
+            "AI call failed: {model} - {error}",
+            model=model,
+            tokens=tokens_used,
+            duration_ms=round(duration_ms, 2),
+            success=success,
+            error=error
+        )
 
 
 def log_whatsapp_event(
@@ -193,19 +223,15 @@ def log_whatsapp_event(
     """Loga eventos do WhatsApp (mensagem recebida, enviada, etc)."""
     masked_phone = f"***{phone_number[-4:]}" if len(phone_number) > 4 else "***"
     
-    log_data = {
-        "event": event_type,
-        "phone": masked_phone,
-        "success": success
-    }
-    
-    if details:
-        log_data.update(details)
-    
-    level = "info" if success else "error"
-    logger.bind(**log_data).log(
-        level.upper(),
-        f"WhatsApp {event_type}: {masked_phone}"
+    logger.log(
+        "INFO" if success else "ERROR",
+        "WhatsApp {event}: {phone}",
+        **{
+            **(details or {}),
+            "event": event_type,
+            "phone": masked_phone,
+            "success": success
+        }
     )
 
 
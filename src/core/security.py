@@ -4,22 +4,32 @@ Inclui validação de assinaturas de webhooks, API keys, etc.
 """
 
 import hmac
-import hashlib
-from fastapi import Request, Header, HTTPException
+import re
+import time
+from functools import lru_cache
+from fastapi import Header, HTTPException
 from typing import Optional
 
-from src.core.config import get_settings
+from src.core.config import settings
 from src.core.exceptions import InvalidWebhookSignatureError, InvalidAPIKeyError
 
-settings = get_settings()
-
 
 # ========================================
 # VALIDAÇÃO DE WEBHOOK DO WHATSAPP
 # ========================================
 
-async def verify_whatsapp_signature(
-    request: Request,
+@lru_cache(maxsize=4)
+def _hmac_template(app_secret: str) -> hmac.HMAC:
+    """
+    HMAC com a chave já processada (ipad/opad); copy() clona esse estado
+    sem derivar a chave de novo a cada webhook.
+    """
+    return hmac.new(app_secret.encode("utf-8"), digestmod="sha256")
+
+
+def verify_whatsapp_signature(
+    body: bytes,
+    signature_header: Optional[str],
     app_secret: str
 ) -> bool:
     """
@@ -29,7 +39,8 @@ async def verify_whatsapp_signature(
     Precisamos recalcular e comparar para garantir autenticidade.
     
     Args:
-        request: Request do FastAPI
+        body: Corpo bruto da requisição (lido uma única vez pela rota)
+        signature_header: Valor do header X-Hub-Signature-256
         app_secret: App Secret do WhatsApp
         
     Returns:
@@ -39,28 +50,21 @@ async def verify_whatsapp_signature(
         InvalidWebhookSignatureError: Se assinatura inválida
     """
     
-    # Pega assinatura do header
-    signature_header = request.headers.get("X-Hub-Signature-256")
-    
     if not signature_header:
         raise InvalidWebhookSignatureError()
     
-    # Remove o prefixo "sha256="
+    # Remove o prefixo "sha256=" e compara bytes crus (sem hexlify do HMAC)
+    if not signature_header.startswith("sha256="):
+        raise InvalidWebhookSignatureError()
     try:
-        provided_signature = signature_header.split("sha256=")[1]
-    except IndexError:
+        provided_signature = bytes.fromhex(signature_header[7:])
+    except ValueError:
         raise InvalidWebhookSignatureError()
     
-    # Pega o corpo bruto da requisição (já foi lido antes, usa request.state)
-    # Precisamos do corpo bruto para calcular o HMAC corretamente
-    body = await request.body()
-    
-    # Calcula HMAC-SHA256
-    expected_signature = hmac.new(
-        key=app_secret.encode('utf-8'),
-        msg=body,
-        digestmod=hashlib.sha256
-    ).hexdigest()
+    # Calcula HMAC-SHA256 a partir do estado já derivado da chave
+    mac = _hmac_template(app_secret).copy()
+    mac.update(body)
+    expected_signature = mac.digest()
     
     # Comparação timing-safe (previne timing attacks)
     if not hmac.compare_digest(provided_signature, expected_signature):
@@ -73,6 +77,9 @@ async def verify_whatsapp_signature(
 # VALIDAÇÃO DE API KEY (para endpoints admin)
 # ========================================
 
+_ADMIN_KEY_BYTES = settings.admin_api_key.get_secret_value().encode("utf-8")
+
+
 async def verify_api_key(
     x_api_key: Optional[str] = Header(None)
 ) -> str:
@@ -88,7 +95,8 @@ async def verify_api_key(
     if not x_api_key:
         raise InvalidAPIKeyError()
     
-    if x_api_key != settings.admin_api_key:
+    # Comparação em tempo constante (previne timing attacks)
+    if not hmac.compare_digest(x_api_key.encode("utf-8"), _ADMIN_KEY_BYTES):
         raise InvalidAPIKeyError()
     
     return x_api_key
@@ -98,6 +106,13 @@ async def verify_api_key(
 # SANITIZAÇÃO DE INPUTS
 # ========================================
 
+_NON_DIGIT = re.compile(r"\D")
+_WHITESPACE = re.compile(r"\s+")
+
+# Máscaras prontas para os tamanhos usuais de telefone
+_MASKS = tuple("*" * n for n in range(20))
+
+
 def sanitize_phone_number(phone: str) -> str:
     """
     Sanitiza número de telefone removendo caracteres não-numéricos.
@@ -108,7 +123,7 @@ def sanitize_phone_number(phone: str) -> str:
     Returns:
         Número apenas com dígitos
     """
-    return "".join(filter(str.isdigit, phone))
+    return _NON_DIGIT.sub("", phone)
 
 
 def mask_phone_number(phone: str, show_last_digits: int = 4) -> str:
@@ -122,10 +137,12 @@ def mask_phone_number(phone: str, show_last_digits: int = 4) -> str:
     Returns:
         Número mascarado (ex: "***1234")
     """
-    if len(phone) <= show_last_digits:
+    hidden = len(phone) - show_last_digits
+    if hidden <= 0:
         return "*" * len(phone)
     
-    return "*" * (len(phone) - show_last_digits) + phone[-show_last_digits:]
+    mask = _MASKS[hidden] if hidden < len(_MASKS) else "*" * hidden
+    return mask + phone[hidden:]
 
 
 def sanitize_user_input(text: str, max_length: int = 1000) -> str:
@@ -145,24 +162,28 @@ def sanitize_user_input(text: str, max_length: int = 1000) -> str:
     # Limita comprimento
     text = text[:max_length]
     
-    # Remove espaços extras
-    text = " ".join(text.split())
-    
-    return text.strip()
+    # Remove espaços extras (sem lista intermediária de palavras)
+    return _WHITESPACE.sub(" ", text).strip()
 
 
 # ========================================
 # RATE LIMITING (helper)
 # ========================================
 
+_COUNT_MASK = 0xFFFFFFFF
+
+
 class RateLimiter:
     """
-    Rate limiter simples baseado em memória.
+    Rate limiter simples baseado em memória (janela fixa).
     Para produção com múltiplos workers, usar Redis.
+    
+    Cada identificador ocupa um único int: (id da janela << 32) | contagem.
     """
     
     def __init__(self):
-        self.requests: dict[str, list[float]] = {}
+        self.buckets: dict[str, int] = {}
+        self._next_sweep = 0.0
     
     def is_allowed(
         self,
@@ -181,26 +202,34 @@ class RateLimiter:
         Returns:
             True se permitido, False se excedeu limite
         """
-        import time
-        
         current_time = time.time()
+        window_id = int(current_time // window_seconds)
         
-        # Limpa requisições antigas
-        if identifier in self.requests:
-            self.requests[identifier] = [
-                req_time for req_time in self.requests[identifier]
-                if current_time - req_time < window_seconds
-            ]
-        else:
-            self.requests[identifier] = []
+        # Remove identificadores de janelas anteriores uma vez por janela
+        if current_time >= self._next_sweep:
+            self._sweep(window_id)
+            self._next_sweep = (window_id + 1) * window_seconds
+        
+        # Contagem zera quando a janela muda
+        packed = self.buckets.get(identifier, 0)
+        count = packed & _COUNT_MASK if packed >> 32 == window_id else 0
         
         # Verifica limite
-        if len(self.requests[identifier]) >= max_requests:
+        if count >= max_requests:
             return False
         
-        # Adiciona requisição atual
-        self.requests[identifier].append(current_time)
+        # Conta a requisição atual
+        self.buckets[identifier] = (window_id << 32) | (count + 1)
         return True
+    
+    def _sweep(self, window_id: int) -> None:
+        """Descarta identificadores sem requisições na janela atual"""
+        stale = [
+            identifier for identifier, packed in self.buckets.items()
+            if packed >> 32 != window_id
+        ]
+        for identifier in stale:
+            del self.buckets[identifier]
 
 
 # Instância global (para simplicidade)
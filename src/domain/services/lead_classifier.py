@@ -3,7 +3,7 @@ Serviço de classificação e pontuação de leads.
 Define regras de negócio para identificar leads quentes/mornos/frios.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Sequence, Tuple
 from loguru import logger
 
 from src.infrastructure.database.models import Lead, Conversation, LeadClassification
@@ -11,6 +11,37 @@ from src.core.config import get_settings
 
 settings = get_settings()
 
+# Thresholds de classificação (Settings é carregado uma vez, sem hot reload)
+_HOT = settings.score_threshold_hot
+_WARM = settings.score_threshold_warm
+
+# Pontos por nível de urgência
+_URGENCY_SCORES = {
+    "emergencia": 30,
+    "alta": 25,
+    "media": 15,
+    "baixa": 5
+}
+
+# Setor destino por (classificação, urgência); urgência None = qualquer outra.
+# Chaves pelo valor: lead.classification pode ser o enum ou a string
+# recém-atribuída, e Enum.__hash__ usa o nome do membro, não o valor
+_ROUTING = {
+    (LeadClassification.HOT.value, "alta"): "VENDAS_PRIORIDADE",
+    (LeadClassification.HOT.value, "media"): "VENDAS_PRIORIDADE",
+    (LeadClassification.HOT.value, None): "VENDAS",
+    (LeadClassification.WARM.value, None): "AGENDAMENTO",
+    (LeadClassification.COLD.value, None): "NUTRICAO",
+}
+
+# Motivo da pontuação: (modelo, *valores), formatado só quando necessário
+Reason = Tuple[Any, ...]
+
+
+def format_reasons(reasons: Sequence[Reason]) -> List[str]:
+    """Converte os motivos de classify_lead em texto"""
+    return [template.format(*values) for template, *values in reasons]
+
 
 class LeadClassifier:
     """
@@ -29,12 +60,12 @@ class LeadClassifier:
             {
                 "classification": "quente|morno|frio|nao_qualificado",
                 "score": 0-100,
-                "reasons": ["motivo1", "motivo2"]
+                "reasons": [(modelo, *valores), ...]  # ver format_reasons
             }
         """
         
         score = 0
-        reasons = []
+        reasons: List[Reason] = []
         
         # ========================================
         # CRITÉRIOS DE PONTUAÇÃO
@@ -43,54 +74,47 @@ class LeadClassifier:
         # 1. DADOS COLETADOS (máximo 40 pontos)
         if lead.name:
             score += 10
-            reasons.append("Nome informado (+10)")
+            reasons.append(("Nome informado (+10)",))
         
         if lead.city:
-            if lead.city in settings.covered_cities_list:
+            if settings.is_covered_city(lead.city):
                 score += 15
-                reasons.append(f"Cidade atendida: {lead.city} (+15)")
+                reasons.append(("Cidade atendida: {} (+15)", lead.city))
             else:
                 score -= 30
-                reasons.append(f"Cidade NÃO atendida: {lead.city} (-30)")
+                reasons.append(("Cidade NÃO atendida: {} (-30)", lead.city))
         
         if lead.prosthesis_type:
             score += 15
-            reasons.append(f"Tipo de prótese definido: {lead.prosthesis_type} (+15)")
+            reasons.append(("Tipo de prótese definido: {} (+15)", lead.prosthesis_type))
         
         # 2. URGÊNCIA (máximo 30 pontos)
-        urgency_scores = {
-            "emergencia": 30,
-            "alta": 25,
-            "media": 15,
-            "baixa": 5
-        }
-        
         if lead.urgency_level:
-            urgency_score = urgency_scores.get(lead.urgency_level, 0)
+            urgency_score = _URGENCY_SCORES.get(lead.urgency_level, 0)
             score += urgency_score
-            reasons.append(f"Urgência {lead.urgency_level} (+{urgency_score})")
+            reasons.append(("Urgência {} (+{})", lead.urgency_level, urgency_score))
         
         # 3. SITUAÇÃO FINANCEIRA (máximo 20 pontos)
         if lead.has_insurance:
             score += 15
-            reasons.append("Possui convênio (+15)")
+            reasons.append(("Possui convênio (+15)",))
         
         if lead.budget_range:
             score += 10
-            reasons.append("Orçamento mencionado (+10)")
+            reasons.append(("Orçamento mencionado (+10)",))
         
         # 4. ENGAJAMENTO (máximo 10 pontos)
         if conversation.user_messages >= 3:
             score += 10
-            reasons.append(f"Engajado ({conversation.user_messages} mensagens) (+10)")
+            reasons.append(("Engajado ({} mensagens) (+10)", conversation.user_messages))
         elif conversation.user_messages >= 2:
             score += 5
-            reasons.append("Engajamento moderado (+5)")
+            reasons.append(("Engajamento moderado (+5)",))
         
         # 5. TEMPO DE RESPOSTA (bônus)
         if conversation.average_response_time and conversation.average_response_time < 120:  # < 2min
             score += 5
-            reasons.append("Respostas rápidas (+5)")
+            reasons.append(("Respostas rápidas (+5)",))
         
         # ========================================
         # PENALIZAÇÕES
@@ -99,12 +123,12 @@ class LeadClassifier:
         # Lead com muitas mensagens mas sem progresso
         if conversation.total_messages > 10 and not conversation.data_collected_complete:
             score -= 15
-            reasons.append("Muitas mensagens sem progresso (-15)")
+            reasons.append(("Muitas mensagens sem progresso (-15)",))
         
         # Conversa muito longa (possível perda de interesse)
         if conversation.total_messages > 20:
             score -= 10
-            reasons.append("Conversa muito longa (-10)")
+            reasons.append(("Conversa muito longa (-10)",))
         
         # ========================================
         # CLASSIFICAÇÃO FINAL
@@ -114,9 +138,9 @@ class LeadClassifier:
         score = max(0, min(100, score))
         
         # Define classificação baseada em thresholds
-        if score >= settings.score_threshold_hot:
+        if score >= _HOT:
             classification = LeadClassification.HOT
-        elif score >= settings.score_threshold_warm:
+        elif score >= _WARM:
             classification = LeadClassification.WARM
         elif score > 0:
             classification = LeadClassification.COLD
@@ -127,7 +151,9 @@ class LeadClassifier:
         logger.info(
             f"Lead {lead.id} classified: {classification} (score={score})"
         )
-        logger.debug(f"Classification reasons: {reasons}")
+        logger.opt(lazy=True).debug(
+            "Classification reasons: {}", lambda: format_reasons(reasons)
+        )
         
         return {
             "classification": classification.value,
@@ -147,22 +173,13 @@ class LeadClassifier:
         if lead.urgency_level == "emergencia":
             return "ATENDIMENTO_URGENTE"
         
-        # QUENTE → Vendas prioritárias
-        if lead.classification == LeadClassification.HOT:
-            if lead.urgency_level in ["alta", "media"]:
-                return "VENDAS_PRIORIDADE"
-            return "VENDAS"
-        
-        # MORNO → Agendamento
-        if lead.classification == LeadClassification.WARM:
-            return "AGENDAMENTO"
-        
-        # FRIO → Nutrição de leads
-        if lead.classification == LeadClassification.COLD:
-            return "NUTRICAO"
-        
-        # NÃO QUALIFICADO → Descarte
-        return "DESCARTE"
+        # QUENTE → Vendas (prioritárias se alta/média), MORNO → Agendamento,
+        # FRIO → Nutrição, NÃO QUALIFICADO → Descarte
+        classification = getattr(lead.classification, "value", lead.classification)
+        return _ROUTING.get(
+            (classification, lead.urgency_level),
+            _ROUTING.get((classification, None), "DESCARTE")
+        )
     
     def should_transfer_to_human(
         self,
@@ -205,10 +222,8 @@ class LeadClassifier:
     def _is_data_complete(self, lead: Lead) -> bool:
         """Verifica se dados essenciais foram coletados"""
         
-        required_fields = [
-            lead.name,
-            lead.city,
-            lead.prosthesis_type
-        ]
-        
-        return all(field is not None for field in required_fields)
\ No newline at end of file
+        return (
+            lead.name is not None
+            and lead.city is not None
+            and lead.prosthesis_type is not None
+        )
\ No newline at end of file
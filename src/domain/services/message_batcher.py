@@ -0,0 +1,142 @@
+"""
+Agrupamento de mensagens recebidas (asynchronous batching).
+Junta rajadas de mensagens do mesmo número antes de chamar a IA,
+garantindo também que cada número tenha um único consumidor por processo.
+Entre processos (vários workers), o MessageProcessor trata a criação
+concorrente do lead e da conversa ativa.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional
+import httpx
+from loguru import logger
+
+from src.domain.services.message_processor import MessageProcessor, InboundMessage
+from src.infrastructure.database.session import get_db_context
+
+# Debounce: o lote fecha após BULK_FLUSH_MS sem novas mensagens do número,
+# ou BULK_MAX_WAIT_MS após a primeira, ou com BULK_SIZE mensagens
+BULK_FLUSH_MS = 800
+BULK_MAX_WAIT_MS = 2000
+BULK_SIZE = 8
+
+# Limites de memória e de concorrência (conexões de banco / chamadas de IA)
+MAX_PENDING_MESSAGES = 10_000
+MAX_CONCURRENT_BATCHES = 16
+
+
+class InboundMessageBatcher:
+    """
+    Fila por número de telefone com um consumidor por número (neste processo).
+    O total de mensagens pendentes e de lotes em paralelo é limitado.
+    
+    O webhook chama submit() e retorna imediatamente. O consumidor espera
+    o número ficar BULK_FLUSH_MS sem mandar mensagens (cada mensagem
+    reinicia a espera, limitada a BULK_MAX_WAIT_MS no total, ou até
+    BULK_SIZE mensagens) e processa o lote com uma única chamada de IA.
+    Mensagens que chegam durante o processamento formam o próximo lote
+    do mesmo número.
+    """
+    
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        redis: Optional[Any] = None,
+        flush_ms: int = BULK_FLUSH_MS,
+        max_wait_ms: int = BULK_MAX_WAIT_MS,
+        max_batch_size: int = BULK_SIZE,
+        max_pending: int = MAX_PENDING_MESSAGES,
+        max_concurrency: int = MAX_CONCURRENT_BATCHES
+    ):
+        self.http_client = http_client
+        self.redis = redis
+        self.flush_seconds = flush_ms / 1000
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_pending = max_pending
+        
+        self._pending_count = 0
+        self._processing = asyncio.Semaphore(max_concurrency)
+        self._pending: Dict[str, List[InboundMessage]] = {}
+        self._arrived: Dict[str, asyncio.Event] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+    
+    def submit(self, phone_number: str, message: InboundMessage) -> bool:
+        """
+        Enfileira mensagem para processamento (não bloqueia).
+        Retorna False se o limite de mensagens pendentes foi atingido.
+        """
+        
+        if self._pending_count >= self.max_pending:
+            logger.warning(f"Inbound queue full, rejecting message from {phone_number}")
+            return False
+        
+        pending = self._pending.setdefault(phone_number, [])
+        pending.append(message)
+        self._pending_count += 1
+        
+        if phone_number not in self._workers:
+            self._arrived[phone_number] = asyncio.Event()
+            self._workers[phone_number] = asyncio.create_task(self._run(phone_number))
+        
+        # Reinicia o debounce do consumidor
+        self._arrived[phone_number].set()
+        
+        return True
+    
+    async def drain(self) -> None:
+        """Aguarda todos os lotes pendentes (usar no shutdown)"""
+        if self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+    
+    async def _run(self, phone_number: str) -> None:
+        """Consumidor de um número: processa lotes até a fila esvaziar"""
+        arrived = self._arrived[phone_number]
+        loop = asyncio.get_running_loop()
+        
+        try:
+            while self._pending.get(phone_number):
+                await self._debounce(phone_number, arrived, loop.time() + self.max_wait_seconds)
+                
+                pending = self._pending.pop(phone_number)
+                batch = pending[:self.max_batch_size]
+                if len(pending) > self.max_batch_size:
+                    self._pending[phone_number] = pending[self.max_batch_size:]
+                
+                # No máximo max_concurrency lotes em paralelo (entre todos os números)
+                async with self._processing:
+                    await self._process_batch(phone_number, batch)
+                self._pending_count -= len(batch)
+        finally:
+            del self._workers[phone_number]
+            del self._arrived[phone_number]
+    
+    async def _debounce(self, phone_number: str, arrived: asyncio.Event, deadline: float) -> None:
+        """Espera o número parar de mandar mensagens (ou o lote encher / o prazo acabar)"""
+        loop = asyncio.get_running_loop()
+        
+        while len(self._pending[phone_number]) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            
+            arrived.clear()
+            try:
+                await asyncio.wait_for(arrived.wait(), timeout=min(self.flush_seconds, remaining))
+            except asyncio.TimeoutError:
+                return
+    
+    async def _process_batch(self, phone_number: str, batch: List[InboundMessage]) -> None:
+        """Processa um lote em sessão própria de banco"""
+        message_ids = [message.whatsapp_message_id for message in batch]
+        
+        try:
+            async with get_db_context() as db:
+                processor = MessageProcessor(db, http_client=self.http_client, redis=self.redis)
+                await processor.process_inbound_batch(phone_number, batch)
+            
+            logger.success(f"✅ Messages processed successfully: {message_ids}")
+        
+        except Exception as e:
+            logger.exception(f"❌ Error processing messages {message_ids}: {e}")
+            # TODO: Implementar retry logic ou dead letter queue
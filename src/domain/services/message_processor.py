@@ -3,23 +3,103 @@ Serviço principal de processamento de mensagens.
 Orquestra todo o fluxo: recebe mensagem → IA → classifica → responde.
 """
 
+from dataclasses import dataclass
 from datetime import datetime, UTC, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+import httpx
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
+from tenacity import RetryCallState, retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
 from src.infrastructure.database.models import (
     Lead, Conversation, Message, Event,
-    LeadStatus, ConversationStatus, MessageDirection, MessageType, EventType
+    LeadStatus, ConversationStatus, MessageDirection, MessageType, EventType,
+    new_id
 )
+from src.infrastructure.database.session import IS_SQLITE
 from src.infrastructure.ai.client import get_ai_client
 from src.infrastructure.messaging.whatsapp_client import WhatsAppClient
-from src.domain.services.lead_classifier import LeadClassifier
+from src.infrastructure.cache.lead_stats import LeadSnapshot, lead_snapshot, record_lead_change
+from src.domain.services.lead_classifier import LeadClassifier, format_reasons
 from src.core.config import get_settings
 from src.core.exceptions import SessionExpiredError, MaxMessagesExceededError
 
 settings = get_settings()
 
+# Mensagens anteriores enviadas à IA como contexto
+HISTORY_LIMIT = 10
+
+# Lead + conversa ativa + últimas HISTORY_LIMIT mensagens, montada uma vez
+# no import (só o telefone varia): cada mensagem recebida apenas executa a
+# query, sem reconstruir a expressão nem recalcular a chave do cache de SQL
+_PHONE = bindparam("phone_number")
+
+# Mensagens da conversa ativa numeradas da mais nova para a mais antiga
+# (filtradas pelo telefone: só a conversa deste lead é percorrida)
+_RECENT = (
+    select(
+        Message.conversation_id,
+        Message.direction,
+        Message.content,
+        func.row_number().over(
+            partition_by=Message.conversation_id,
+            order_by=Message.created_at.desc()
+        ).label("position")
+    )
+    .join(Conversation, Conversation.id == Message.conversation_id)
+    .join(Lead, Lead.id == Conversation.lead_id)
+    .where(
+        Lead.phone_number == _PHONE,
+        Conversation.status == ConversationStatus.ACTIVE
+    )
+    .subquery()
+)
+
+_LEAD_WITH_HISTORY = (
+    select(Lead, Conversation, _RECENT.c.direction, _RECENT.c.content)
+    .outerjoin(
+        Conversation,
+        (Conversation.lead_id == Lead.id)
+        & (Conversation.status == ConversationStatus.ACTIVE)
+    )
+    .outerjoin(
+        _RECENT,
+        (_RECENT.c.conversation_id == Conversation.id)
+        & (_RECENT.c.position <= HISTORY_LIMIT)
+    )
+    .where(Lead.phone_number == _PHONE)
+    .order_by(_RECENT.c.position.desc())
+)
+
+# INSERT ... ON CONFLICT DO NOTHING (mesma API no SQLite e no PostgreSQL)
+dialect_insert = sqlite_insert if IS_SQLITE else postgresql_insert
+
+# Envio pelo WhatsApp só com token configurado (calculado uma vez)
+WHATSAPP_ENABLED = bool(settings.whatsapp_access_token.get_secret_value().strip())
+
+# Tentativas de obter conexão quando o pool esgota db_pool_timeout
+POOL_TIMEOUT_ATTEMPTS = 3
+
+
+def _log_pool_timeout(retry_state: RetryCallState) -> None:
+    logger.warning(
+        f"⚠️ Database pool timeout (attempt {retry_state.attempt_number}), "
+        f"retrying checkout: {retry_state.outcome.exception()}"
+    )
+
+
+@dataclass(frozen=True)
+class InboundMessage:
+    """Mensagem recebida pelo webhook, ainda não persistida"""
+    whatsapp_message_id: str
+    content: str
+    message_type: str
+    timestamp: str
+
 
 class MessageProcessor:
     """
@@ -27,10 +107,16 @@ class MessageProcessor:
     Coordena Lead, Conversation, IA e envio de respostas.
     """
     
-    def __init__(self, db: AsyncSession):
+    def __init__(
+        self,
+        db: AsyncSession,
+        http_client: Optional[httpx.AsyncClient] = None,
+        redis: Optional[Any] = None
+    ):
         self.db = db
+        self.redis = redis
         self.ai = get_ai_client()
-        self.whatsapp = WhatsAppClient()
+        self.whatsapp = WhatsAppClient(http_client=http_client)
         self.classifier = LeadClassifier()
     
     async def process_inbound_message(
@@ -40,15 +126,29 @@ class MessageProcessor:
         content: str,
         message_type: str,
         timestamp: str
+    ) -> None:
+        """Processa uma única mensagem recebida do usuário"""
+        await self.process_inbound_batch(
+            phone_number,
+            [InboundMessage(whatsapp_message_id, content, message_type, timestamp)]
+        )
+    
+    async def process_inbound_batch(
+        self,
+        phone_number: str,
+        messages: Sequence[InboundMessage]
     ) -> None:
         """
-        Processa mensagem recebida do usuário.
+        Processa um lote de mensagens do mesmo usuário com uma única chamada de IA.
+        
+        O WhatsApp entrega mensagens em rajadas ("oi" / "tudo bem?" / "queria
+        saber do preço"); responder ao lote evita N chamadas de IA e N respostas.
         
         Fluxo:
         1. Busca/cria Lead
         2. Busca/cria Conversation
         3. Valida sessão e limites
-        4. Salva mensagem no banco
+        4. Salva mensagens no banco (um INSERT multi-row)
         5. Processa com IA
         6. Atualiza Lead com dados extraídos
         7. Classifica Lead
@@ -56,37 +156,50 @@ class MessageProcessor:
         9. Verifica se deve transferir para humano
         """
         
-        logger.info(f"Processing inbound message from {phone_number}")
+        logger.info(f"Processing {len(messages)} inbound message(s) from {phone_number}")
         
-        # ========== 1. LEAD ==========
-        lead = await self._get_or_create_lead(phone_number)
+        # Um único "agora" para os timestamps do recebimento
+        now = datetime.now(UTC)
         
-        # ========== 2. CONVERSATION ==========
-        conversation = await self._get_or_create_conversation(lead)
+        # ========== 1-2. LEAD E CONVERSATION ==========
+        try:
+            lead, conversation, history, stats_before = await self._open_turn(phone_number)
+        except IntegrityError:
+            # Outro worker (processo) criou o lead ou a conversa ativa deste
+            # número entre a leitura e o flush: recarrega e segue com os dele
+            logger.info(f"Lead/conversation for {phone_number} created concurrently, reloading")
+            await self.db.rollback()
+            lead, conversation, history, stats_before = await self._open_turn(phone_number)
         
         # ========== 3. VALIDAÇÕES ==========
         await self._validate_session(conversation)
         
-        # ========== 4. SALVA MENSAGEM DO USUÁRIO ==========
-        user_message = await self._save_message(
-            conversation_id=conversation.id,
-            direction=MessageDirection.INBOUND,
-            content=content,
-            message_type=message_type,
-            whatsapp_message_id=whatsapp_message_id
-        )
+        # ========== 4. SALVA MENSAGENS DO USUÁRIO ==========
+        saved = await self._save_inbound_messages(conversation.id, messages)
+        
+        if not saved:
+            # Reentrega do webhook: todas as mensagens já foram processadas
+            logger.info(f"Duplicate delivery ignored for {phone_number}")
+            await self.db.commit()
+            await self._record_stats_change(lead, stats_before)
+            return
+        
+        content = "\n".join(message.content for message in saved)
         
-        # Atualiza contadores
-        conversation.total_messages += 1
-        conversation.user_messages += 1
-        conversation.last_activity_at = datetime.now(UTC)
-        lead.last_message_at = datetime.now(UTC)
+        # Atualiza contadores (incrementos atômicos; a conversa volta do
+        # banco com os valores somados, para o classificador)
+        ai_added = 0
+        await self._record_inbound(conversation, len(saved), now)
+        lead.last_message_at = now
+        
+        # Commit antes da IA: a sessão devolve a conexão ao pool e só volta
+        # ao banco no commit final. No SQLite o pool de escrita tem uma única
+        # conexão; segurá-la durante a IA e o envio ao WhatsApp fazia os
+        # lotes de outros telefones estourarem db_pool_timeout
+        await self.db.commit()
         
         # ========== 5. PROCESSA COM IA ==========
         try:
-            # Pega histórico da conversa
-            history = await self._get_conversation_history(conversation.id)
-            
             # Pega dados já coletados do lead
             lead_data = self._lead_to_dict(lead)
             
@@ -99,8 +212,14 @@ class MessageProcessor:
             
             logger.info(f"AI response: intent={ai_response.intent}, confidence={ai_response.confidence}")
             
+            # Timestamps posteriores à IA (a chamada leva centenas de ms)
+            now_ai = datetime.now(UTC)
+            
+            # Dados extraídos viram dict uma vez (usado no lead e na mensagem)
+            extracted = ai_response.extracted_data.model_dump()
+            
             # ========== 6. ATUALIZA LEAD COM DADOS EXTRAÍDOS ==========
-            await self._update_lead_with_extracted_data(lead, ai_response.extracted_data)
+            await self._update_lead_with_extracted_data(lead, extracted)
             
             # ========== 7. CLASSIFICA LEAD ==========
             classification = self.classifier.classify_lead(lead, conversation)
@@ -109,24 +228,30 @@ class MessageProcessor:
             
             # Se foi qualificado pela primeira vez
             if not lead.qualified_at and classification["classification"] in ["quente", "morno"]:
-                lead.qualified_at = datetime.now(UTC)
+                lead.qualified_at = now_ai
                 lead.status = LeadStatus.QUALIFIED
                 
                 # Registra evento
                 await self._create_event(
                     lead_id=lead.id,
                     event_type=EventType.CLASSIFIED,
-                    data={"classification": classification}
+                    data={
+                        "classification": {
+                            **classification,
+                            "reasons": format_reasons(classification["reasons"])
+                        }
+                    }
                 )
             
             # ========== 8. ENVIA RESPOSTA ==========
             response_text = ai_response.response_text
             
             # Adiciona contexto se necessário (ex: cidade não atendida)
-            if ai_response.extracted_data.cidade:
-                if ai_response.extracted_data.cidade not in settings.covered_cities_list:
+            city = extracted["cidade"]
+            if city:
+                if not settings.is_covered_city(city):
                     response_text += (
-                        f"\n\n⚠️ Nota: Ainda não atendemos {ai_response.extracted_data.cidade}. "
+                        f"\n\n⚠️ Nota: Ainda não atendemos {city}. "
                         "Quer deixar seu contato para futuras expansões?"
                     )
             
@@ -137,11 +262,11 @@ class MessageProcessor:
                 content=response_text,
                 message_type=MessageType.TEXT,
                 ai_model="gemini-2.5-flash",
-                extracted_data=ai_response.extracted_data.model_dump()
+                extracted_data=extracted
             )
             
             # Envia via WhatsApp (apenas se token configurado)
-            if settings.whatsapp_access_token and settings.whatsapp_access_token.strip():
+            if WHATSAPP_ENABLED:
                 sent = await self.whatsapp.send_text_message(
                     phone_number=phone_number,
                     message=response_text
@@ -154,10 +279,11 @@ class MessageProcessor:
             else:
                 logger.warning("⚠️ WhatsApp token not configured, skipping send")
                 # Marca como "enviado virtualmente" para testes
-                ai_message.sent_at = datetime.now(UTC)
+                ai_message.sent_at = now_ai
             
             conversation.total_messages += 1
             conversation.ai_messages += 1
+            ai_added = 1
             
             # ========== 9. TRANSFERE PARA HUMANO SE NECESSÁRIO ==========
             if ai_response.should_transfer_to_human:
@@ -165,7 +291,7 @@ class MessageProcessor:
                 
                 conversation.status = ConversationStatus.TRANSFERRED
                 conversation.transferred_to_human = True
-                conversation.ended_at = datetime.now(UTC)
+                conversation.ended_at = now_ai
                 
                 lead.status = LeadStatus.TRANSFERRED
                 lead.routed_to = self.classifier.determine_routing(lead)
@@ -192,7 +318,7 @@ class MessageProcessor:
                 "Nossa equipe será notificada e entrará em contato em breve!"
             )
             
-            if settings.whatsapp_access_token and settings.whatsapp_access_token.strip():
+            if WHATSAPP_ENABLED:
                 await self.whatsapp.send_text_message(
                     phone_number=phone_number,
                     message=error_message
@@ -201,32 +327,118 @@ class MessageProcessor:
             raise
         
         finally:
-            # Commit de todas as mudanças
+            # Commit de todas as mudanças (a conexão anterior voltou ao pool
+            # no commit antes da IA)
+            await self._checkout()
+            self._persist_counters(conversation, ai_added)
             await self.db.commit()
+            await self._record_stats_change(lead, stats_before)
             logger.success(f"✅ Message processed successfully for {phone_number}")
     
     # ========================================
     # MÉTODOS AUXILIARES
     # ========================================
     
-    async def _get_or_create_lead(self, phone_number: str) -> Lead:
-        """Busca lead existente ou cria novo"""
-        from sqlalchemy import select
-        
+    @retry(
+        retry=retry_if_exception_type(PoolTimeoutError),
+        stop=stop_after_attempt(POOL_TIMEOUT_ATTEMPTS),
+        wait=wait_random_exponential(multiplier=1, max=10),
+        before_sleep=_log_pool_timeout,
+        reraise=True
+    )
+    async def _checkout(self) -> None:
+        """
+        Obtém a conexão da transação antes do primeiro comando. O timeout do
+        pool só acontece aqui; a sessão continua intacta (mudanças pendentes
+        inclusive), então a espera é repetida sem reprocessar o lote, que
+        já pode ter mensagens gravadas e resposta enviada.
+        """
+        await self.db.connection()
+    
+    async def _open_turn(
+        self,
+        phone_number: str
+    ) -> Tuple[Lead, Conversation, List[Dict[str, str]], Optional[LeadSnapshot]]:
+        """
+        Passos 1 e 2: lead (com conversa ativa e histórico, na mesma query)
+        e conversa. Returns: (lead, conversa, histórico, estado anterior para
+        as estatísticas ou None se o lead foi criado)
+        """
+        await self._checkout()
+        lead, conversation, history, created = await self._get_or_create_lead(phone_number)
+        stats_before = None if created else lead_snapshot(lead.status, lead.classification, lead.score)
+        conversation = await self._get_or_create_conversation(lead, conversation)
+        return lead, conversation, history, stats_before
+    
+    async def _record_stats_change(self, lead: Lead, stats_before: Optional[LeadSnapshot]) -> None:
+        """Atualiza os contadores de estatísticas com o novo estado do lead"""
+        await record_lead_change(
+            self.redis,
+            stats_before,
+            lead_snapshot(lead.status, lead.classification, lead.score)
+        )
+    
+    async def _record_inbound(
+        self,
+        conversation: Conversation,
+        count: int,
+        now: datetime
+    ) -> None:
+        """
+        Grava as mensagens recebidas nos contadores como SET x = x + n: o
+        banco soma sobre o valor atual da linha, sem perder mensagens contadas
+        por outro worker no mesmo intervalo. O RETURNING recarrega a conversa
+        com os valores somados, sem atributos expirados após o commit.
+        """
         result = await self.db.execute(
-            select(Lead).where(Lead.phone_number == phone_number)
+            update(Conversation)
+            .where(Conversation.id == conversation.id)
+            .values(
+                total_messages=Conversation.total_messages + count,
+                user_messages=Conversation.user_messages + count,
+                last_activity_at=now
+            )
+            .returning(Conversation)
+            .execution_options(populate_existing=True)
         )
-        lead = result.scalar_one_or_none()
+        result.scalar_one()
+    
+    @staticmethod
+    def _persist_counters(conversation: Conversation, ai_added: int) -> None:
+        """
+        Grava a resposta da IA nos contadores como SET x = x + n, no commit
+        final (o valor em memória continua servindo ao classificador)
+        """
+        if ai_added:
+            conversation.total_messages = Conversation.total_messages + ai_added
+            conversation.ai_messages = Conversation.ai_messages + ai_added
+    
+    async def _get_or_create_lead(
+        self,
+        phone_number: str
+    ) -> Tuple[Lead, Optional[Conversation], List[Dict[str, str]], bool]:
+        """
+        Busca lead existente ou cria novo. Uma única ida ao banco traz o
+        lead, a conversa ativa e as últimas HISTORY_LIMIT mensagens dela
+        (uma linha por mensagem, via LEFT JOIN). O índice único
+        idx_conv_active_lead garante no máximo uma conversa ativa por lead.
+        
+        Returns:
+            (lead, conversa ativa ou None, histórico para a IA, se o lead foi criado)
+        """
+        result = await self.db.execute(_LEAD_WITH_HISTORY, {"phone_number": phone_number})
+        rows = result.all()
         
-        if not lead:
+        if not rows:
+            # ID gerado aqui (não no flush) para o evento referenciar o lead
             lead = Lead(
+                id=new_id(),
                 phone_number=phone_number,
                 status=LeadStatus.NEW,
                 first_contact_at=datetime.now(UTC),
                 source="whatsapp"
             )
             self.db.add(lead)
-            await self.db.flush()  # Gera ID
             
             # Registra evento
             await self._create_event(
@@ -236,21 +448,27 @@ class MessageProcessor:
             )
             
             logger.info(f"Created new lead: {lead.id}")
-        
-        return lead
+            return lead, None, [], True
+        
+        lead, conversation = rows[0][:2]
+        # Linhas já vêm das mais antigas para as mais novas; sem mensagens,
+        # o LEFT JOIN devolve uma única linha com direction/content nulos
+        history = [
+            {
+                "role": "user" if direction == MessageDirection.INBOUND else "assistant",
+                "content": content
+            }
+            for _, _, direction, content in rows
+            if direction is not None
+        ]
+        return lead, conversation, history, False
     
-    async def _get_or_create_conversation(self, lead: Lead) -> Conversation:
-        """Busca conversa ativa ou cria nova"""
-        from sqlalchemy import select
-        
-        # Busca conversa ativa
-        result = await self.db.execute(
-            select(Conversation)
-            .where(Conversation.lead_id == lead.id)
-            .where(Conversation.status == ConversationStatus.ACTIVE)
-            .order_by(Conversation.started_at.desc())
-        )
-        conversation = result.scalar_one_or_none()
+    async def _get_or_create_conversation(
+        self,
+        lead: Lead,
+        conversation: Optional[Conversation]
+    ) -> Conversation:
+        """Cria nova conversa se o lead não tiver uma ativa"""
         
         if not conversation:
             conversation = Conversation(
@@ -258,6 +476,8 @@ class MessageProcessor:
                 status=ConversationStatus.ACTIVE
             )
             self.db.add(conversation)
+            # Único flush do fluxo: grava lead/evento/conversa novos e
+            # preenche os defaults usados em _validate_session
             await self.db.flush()
             
             logger.info(f"Created new conversation: {conversation.id}")
@@ -320,39 +540,54 @@ class MessageProcessor:
         )
         
         self.db.add(message)
-        await self.db.flush()
         
         return message
     
-    async def _get_conversation_history(
+    async def _save_inbound_messages(
         self,
         conversation_id: str,
-        limit: int = 10
-    ) -> List[Dict[str, str]]:
-        """Retorna histórico da conversa formatado para IA"""
-        from sqlalchemy import select
+        messages: Sequence[InboundMessage]
+    ) -> List[InboundMessage]:
+        """
+        Salva mensagens recebidas com um único INSERT multi-row.
+        Reentregas do webhook (whatsapp_message_id já gravado) são ignoradas
+        pelo ON CONFLICT DO NOTHING, no mesmo round-trip e sem subtransação.
+        
+        Returns:
+            Mensagens efetivamente salvas (sem as duplicadas)
+        """
+        rows = [
+            {
+                "conversation_id": conversation_id,
+                "direction": MessageDirection.INBOUND,
+                "message_type": message.message_type,
+                "content": message.content,
+                "whatsapp_message_id": message.whatsapp_message_id,
+            }
+            for message in messages
+        ]
         
         result = await self.db.execute(
-            select(Message)
-            .where(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.desc())
-            .limit(limit)
+            dialect_insert(Message)
+            .values(rows)
+            .on_conflict_do_nothing(
+                index_elements=[Message.whatsapp_message_id],
+                index_where=Message.whatsapp_message_id.is_not(None)
+            )
+            .returning(Message.whatsapp_message_id)
         )
-        messages = result.scalars().all()
-        
-        # Inverte ordem (mais antigas primeiro)
-        messages = list(reversed(messages))
-        
-        # Formata para IA
-        history = []
-        for msg in messages:
-            role = "user" if msg.direction == MessageDirection.INBOUND else "assistant"
-            history.append({
-                "role": role,
-                "content": msg.content
-            })
+        inserted = set(result.scalars())
+        
+        # RETURNING só traz as linhas gravadas (cada ID conta uma vez)
+        saved = []
+        for message in messages:
+            if message.whatsapp_message_id in inserted:
+                inserted.discard(message.whatsapp_message_id)
+                saved.append(message)
+            else:
+                logger.info(f"Skipping duplicate message {message.whatsapp_message_id}")
         
-        return history
+        return saved
     
     def _lead_to_dict(self, lead: Lead) -> Dict[str, Any]:
         """Converte Lead para dicionário"""
@@ -369,30 +604,34 @@ class MessageProcessor:
     async def _update_lead_with_extracted_data(
         self,
         lead: Lead,
-        extracted: Any
+        extracted: Dict[str, Any]
     ) -> None:
-        """Atualiza lead com dados extraídos pela IA"""
+        """Atualiza lead com dados extraídos pela IA (AIExtractedData.model_dump())"""
         
-        if extracted.nome and not lead.name:
-            lead.name = extracted.nome
+        nome = extracted.get("nome")
+        if nome and not lead.name:
+            lead.name = nome
         
-        if extracted.cidade and not lead.city:
-            lead.city = extracted.cidade
+        cidade = extracted.get("cidade")
+        if cidade and not lead.city:
+            lead.city = cidade
         
-        if extracted.estado and not lead.state:
-            lead.state = extracted.estado
+        estado = extracted.get("estado")
+        if estado and not lead.state:
+            lead.state = estado
         
-        if extracted.tipo_protese and not lead.prosthesis_type:
-            lead.prosthesis_type = extracted.tipo_protese
+        tipo_protese = extracted.get("tipo_protese")
+        if tipo_protese and not lead.prosthesis_type:
+            lead.prosthesis_type = tipo_protese
         
-        if extracted.urgencia:
+        urgencia = extracted.get("urgencia")
+        if urgencia:
             # Sempre atualiza urgência (pode aumentar)
-            lead.urgency_level = extracted.urgencia
-        
-        if extracted.possui_convenio is not None and lead.has_insurance is None:
-            lead.has_insurance = extracted.possui_convenio
+            lead.urgency_level = urgencia
         
-        await self.db.flush()
+        possui_convenio = extracted.get("possui_convenio")
+        if possui_convenio is not None and lead.has_insurance is None:
+            lead.has_insurance = possui_convenio
     
     async def _create_event(
         self,
@@ -410,7 +649,6 @@ class MessageProcessor:
         )
         
         self.db.add(event)
-        await self.db.flush()
         
         return event
     
@@ -0,0 +1,125 @@
+"""
+Atualização de status de mensagens enviadas (sent, delivered, read, failed).
+O webhook enfileira os status e um consumidor único grava em lote,
+juntando tudo o que chegou enquanto o lote anterior era gravado.
+"""
+
+import asyncio
+from datetime import datetime, UTC
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from sqlalchemy import update, case
+
+from src.infrastructure.database.models import Message
+from src.infrastructure.database.session import get_db_context
+
+# Status do WhatsApp -> coluna de timestamp em Message
+STATUS_COLUMNS = {
+    "sent": "sent_at",
+    "delivered": "delivered_at",
+    "read": "read_at",
+    "failed": "failed_at",
+}
+
+# Máximo de payloads aguardando gravação
+STATUS_QUEUE_SIZE = 10_000
+
+_from_timestamp = datetime.fromtimestamp
+
+
+async def update_message_statuses(statuses: List[Dict[str, Any]]) -> None:
+    """
+    Agrupa por coluna e faz um UPDATE por coluna com CASE por
+    whatsapp_message_id, em sessão própria e com um único commit.
+    """
+    # coluna -> {whatsapp_message_id: timestamp}
+    by_column: Dict[str, Dict[str, datetime]] = {}
+    
+    for status_data in statuses:
+        message_id = status_data.get("id")
+        status = status_data.get("status")
+        timestamp = status_data.get("timestamp")
+        
+        logger.debug(f"Message {message_id} status: {status} at {timestamp}")
+        
+        column = STATUS_COLUMNS.get(status)
+        if column is None or not message_id or not timestamp:
+            continue
+        
+        try:
+            at = _from_timestamp(int(timestamp), UTC)
+        except (TypeError, ValueError, OverflowError, OSError):
+            logger.warning(f"Skipping status with invalid timestamp for {message_id}: {timestamp!r}")
+            continue
+        
+        by_column.setdefault(column, {})[message_id] = at
+    
+    if not by_column:
+        return
+    
+    try:
+        async with get_db_context() as db:
+            for column, timestamps in by_column.items():
+                await db.execute(
+                    update(Message)
+                    .where(Message.whatsapp_message_id.in_(timestamps))
+                    .values({column: case(timestamps, value=Message.whatsapp_message_id)})
+                )
+        
+        logger.info(f"Updated {len(statuses)} message status(es)")
+    
+    except Exception as e:
+        logger.error(f"Error updating message statuses: {e}")
+
+
+class MessageStatusUpdater:
+    """
+    Fila limitada de status com um consumidor de longa duração.
+    
+    submit() não bloqueia: retorna False se a fila estiver cheia, e o
+    webhook responde 503 para o WhatsApp reenviar depois.
+    """
+    
+    def __init__(self, maxsize: int = STATUS_QUEUE_SIZE):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._consumer: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """Inicia o consumidor (chamar no startup)"""
+        if self._consumer is None:
+            self._consumer = asyncio.create_task(self._run())
+    
+    def submit(self, statuses: List[Dict[str, Any]]) -> bool:
+        """Enfileira os status de um payload"""
+        try:
+            self._queue.put_nowait(statuses)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Status queue full, rejecting webhook")
+            return False
+    
+    async def stop(self) -> None:
+        """Grava o que estiver na fila e encerra o consumidor (shutdown)"""
+        await self._queue.join()
+        if self._consumer is not None:
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+            self._consumer = None
+    
+    async def _run(self) -> None:
+        """Consome a fila juntando todos os payloads disponíveis em um lote"""
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            try:
+                await update_message_statuses(
+                    [status for statuses in batch for status in statuses]
+                )
+            except Exception:
+                # Um lote inválido não pode derrubar o consumidor
+                logger.exception("Error processing status batch")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
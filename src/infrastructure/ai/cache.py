@@ -0,0 +1,226 @@
+"""
+Cache de respostas da IA.
+
+A chave é o sha256 de (modelo, temperatura, prompt completo). O prompt já
+inclui histórico e dados do lead, então só repete de verdade em casos como
+a saudação inicial de leads novos ("oi") ou em loops de teste.
+
+Com temperatura 0 a resposta é determinística e fica em cache por mais
+tempo; acima disso o TTL é curto, só para absorver repetições próximas.
+
+SemanticCache (opcional, AI_SEMANTIC_CACHE_ENABLED) cobre as variações de
+texto ("quero saber sobre prótese" / "queria informação sobre prótese"):
+compara o embedding da mensagem com respostas anteriores do mesmo
+namespace (hash do histórico + dados do lead), para que uma resposta que
+cita nome/cidade de um lead nunca seja servida a outro.
+"""
+
+import asyncio
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+import orjson
+from loguru import logger
+
+# TTLs por tipo de geração
+AI_CACHE_TTL_SECONDS = 3600
+AI_CACHE_TTL_NONDETERMINISTIC_SECONDS = 300
+
+# Máximo de respostas mantidas em memória
+AI_CACHE_MAXSIZE = 1024
+
+# Cache semântico: namespaces mantidos e respostas por namespace
+AI_SEMANTIC_CACHE_NAMESPACES = 1024
+AI_SEMANTIC_CACHE_PER_NAMESPACE = 32
+
+
+class CacheBackend(Protocol):
+    """Armazenamento das respostas (memória local, Redis...)"""
+    
+    async def get(self, key: str) -> Optional[bytes]: ...
+    
+    async def set(self, key: str, value: bytes, ttl_seconds: int) -> None: ...
+    
+    async def delete(self, key: str) -> None: ...
+
+
+class MemoryBackend:
+    """
+    LRU em memória com expiração por item.
+    As operações não têm await entre leitura e escrita, então são
+    atômicas no event loop e dispensam lock.
+    """
+    
+    def __init__(self, maxsize: int = AI_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        # chave -> (expira em, valor)
+        self._items: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+    
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            return None
+        
+        self._items.move_to_end(key)
+        return value
+    
+    async def set(self, key: str, value: bytes, ttl_seconds: int) -> None:
+        self._items[key] = (time.monotonic() + ttl_seconds, value)
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+    
+    async def delete(self, key: str) -> None:
+        self._items.pop(key, None)
+
+
+class LLMCache:
+    """Cache de respostas da IA com contadores de acerto"""
+    
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.stats = {"hits": 0, "misses": 0}
+    
+    @staticmethod
+    def cache_key(model: str, contents: str, temperature: float) -> str:
+        """Chave do prompt (sha256 direto dos bytes do orjson)"""
+        return hashlib.sha256(orjson.dumps((model, temperature, contents))).hexdigest()
+    
+    @staticmethod
+    def ttl_for(temperature: float) -> int:
+        """TTL conforme a geração seja determinística ou não"""
+        if temperature == 0:
+            return AI_CACHE_TTL_SECONDS
+        return AI_CACHE_TTL_NONDETERMINISTIC_SECONDS
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Resposta em cache (dict de AIResponse) ou None"""
+        raw = await self.backend.get(key)
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+        
+        self.stats["hits"] += 1
+        return orjson.loads(raw)
+    
+    async def set(self, key: str, response: Dict[str, Any], temperature: float) -> None:
+        """Guarda a resposta (AIResponse.model_dump())"""
+        await self.backend.set(key, orjson.dumps(response), self.ttl_for(temperature))
+    
+    async def delete(self, key: str) -> None:
+        """Remove uma resposta do cache"""
+        await self.backend.delete(key)
+
+
+class SemanticCache:
+    """
+    Respostas por similaridade de cosseno entre embeddings locais.
+    
+    O modelo (sentence-transformers) é carregado em warm_up() ou na
+    primeira consulta; sem a biblioteca o cache fica desativado. A carga e
+    o encode() são CPU-bound e rodam em thread para não bloquear o event loop.
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        threshold: float,
+        ttl_seconds: int = AI_CACHE_TTL_NONDETERMINISTIC_SECONDS
+    ):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0}
+        
+        self._encoder: Any = None
+        self._available = True
+        self._load_lock = asyncio.Lock()
+        # namespace -> [(expira em, embedding normalizado, resposta)]
+        self._entries: "OrderedDict[str, List[Tuple[float, Any, bytes]]]" = OrderedDict()
+    
+    @staticmethod
+    def namespace(
+        conversation_history: List[Dict[str, str]],
+        lead_data: Optional[Dict[str, Any]]
+    ) -> str:
+        """Estado da conversa em que a resposta vale (histórico + dados do lead)"""
+        payload = orjson.dumps(
+            (conversation_history, lead_data or {}),
+            option=orjson.OPT_SORT_KEYS
+        )
+        return hashlib.sha256(payload).hexdigest()
+    
+    def _load_encoder(self) -> Any:
+        """Carrega o modelo de embeddings (None se indisponível)"""
+        if self._encoder is None and self._available:
+            try:
+                from sentence_transformers import SentenceTransformer
+                
+                self._encoder = SentenceTransformer(self.model_name)
+                logger.info(f"✅ Semantic cache enabled ({self.model_name})")
+            except Exception as e:
+                self._available = False
+                logger.warning(f"Semantic cache disabled: {e}")
+        return self._encoder
+    
+    async def warm_up(self) -> None:
+        """Carrega o modelo em thread (startup), fora do caminho da primeira mensagem"""
+        if self._encoder is None and self._available:
+            async with self._load_lock:
+                if self._encoder is None and self._available:
+                    await asyncio.to_thread(self._load_encoder)
+    
+    async def _embed(self, text: str) -> Any:
+        await self.warm_up()
+        encoder = self._encoder
+        if encoder is None:
+            return None
+        return await asyncio.to_thread(encoder.encode, text, normalize_embeddings=True)
+    
+    async def lookup(self, namespace: str, text: str) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """
+        Resposta mais parecida acima do threshold (ou None) e o embedding
+        calculado, para reaproveitar em store().
+        """
+        embedding = await self._embed(text)
+        if embedding is None:
+            return None, None
+        
+        now = time.monotonic()
+        best_score, best = self.threshold, None
+        entries = self._entries.get(namespace)
+        if entries:
+            entries[:] = [entry for entry in entries if entry[0] > now]
+            for _, cached_embedding, response in entries:
+                # Embeddings normalizados: produto escalar = cosseno
+                score = float(cached_embedding @ embedding)
+                if score >= best_score:
+                    best_score, best = score, response
+            self._entries.move_to_end(namespace)
+        
+        if best is None:
+            self.stats["misses"] += 1
+            return None, embedding
+        
+        self.stats["hits"] += 1
+        return orjson.loads(best), embedding
+    
+    async def store(self, namespace: str, embedding: Any, response: Dict[str, Any]) -> None:
+        """Guarda a resposta (AIResponse.model_dump()) para o embedding"""
+        if embedding is None:
+            return
+        
+        entries = self._entries.setdefault(namespace, [])
+        entries.append((time.monotonic() + self.ttl_seconds, embedding, orjson.dumps(response)))
+        del entries[:-AI_SEMANTIC_CACHE_PER_NAMESPACE]
+        
+        self._entries.move_to_end(namespace)
+        if len(self._entries) > AI_SEMANTIC_CACHE_NAMESPACES:
+            self._entries.popitem(last=False)
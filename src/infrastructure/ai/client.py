@@ -3,18 +3,97 @@ Cliente SIMPLIFICADO para Gemini 2.5 Flash (gratuito e moderno).
 Usando a biblioteca google-genai mais recente.
 """
 
-import json
 import asyncio
+from functools import cache
 from typing import Optional, Dict, Any, List
+import httpx
+import requests
 from loguru import logger
 from google import genai  # BIBLIOTECA NOVA!
+from google.genai import errors, types
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 from src.core.config import get_settings
 from src.api.schemas.ai import AIResponse, AIExtractedData
-from src.infrastructure.ai.prompts import build_triage_prompt
+from src.infrastructure.ai.prompts import build_triage_prompt, get_system_prompt
+from src.infrastructure.ai.cache import LLMCache, MemoryBackend, SemanticCache
 
 settings = get_settings()
 
+# Cabeçalho de cada papel no texto enviado ao Gemini
+_ROLE_HEADERS = {
+    "system": "## INSTRUÇÕES DO SISTEMA\n",
+    "user": "## USUÁRIO\n",
+    "assistant": "## ASSISTENTE\n",
+}
+
+_NULL_SCHEMA = {"type": "null"}
+
+# Falhas de rede do transporte do SDK (requests no 1.2; httpx nas versões novas)
+_NETWORK_ERRORS = (requests.ConnectionError, requests.Timeout, httpx.TransportError)
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Erros que valem nova tentativa: 5xx, 429 (rate limit) e falhas de rede"""
+    if isinstance(error, errors.ServerError):
+        return True
+    if isinstance(error, errors.ClientError):
+        return error.code == 429
+    return isinstance(error, _NETWORK_ERRORS)
+
+
+def _log_retry(retry_state: RetryCallState) -> None:
+    logger.warning(
+        f"Gemini call failed (attempt {retry_state.attempt_number}), retrying: "
+        f"{retry_state.outcome.exception()}"
+    )
+
+
+def _to_gemini_schema(schema: Any) -> Any:
+    """
+    Adapta o JSON Schema do Pydantic ao subconjunto aceito pelo Gemini:
+    remove "default" e troca anyOf [X, null] (campos Optional) por X + nullable.
+    """
+    if isinstance(schema, dict):
+        any_of = schema.get("anyOf")
+        if any_of and len(any_of) == 2 and _NULL_SCHEMA in any_of:
+            (inner,) = [option for option in any_of if option != _NULL_SCHEMA]
+            schema = {**schema, **inner, "nullable": True}
+            del schema["anyOf"]
+        return {k: _to_gemini_schema(v) for k, v in schema.items() if k != "default"}
+    if isinstance(schema, list):
+        return [_to_gemini_schema(v) for v in schema]
+    return schema
+
+
+# Saída estruturada: o Gemini responde só o JSON no formato de AIResponse
+_RESPONSE_SCHEMA = _to_gemini_schema(AIResponse.model_json_schema())
+
+# Respostas de fallback (montadas uma vez; AIResponse é imutável)
+_FALLBACK_URGENT_SAO_PAULO = AIResponse(
+    response_text=(
+        "Olá! Entendo que você precisa de uma prótese dentária urgente em São Paulo. "
+        "Vou priorizar seu atendimento! Qual é seu nome completo?"
+    ),
+    extracted_data=AIExtractedData(
+        cidade="São Paulo",
+        urgencia="alta"
+    ),
+    intent="urgencia",
+    confidence=0.9,
+    should_transfer_to_human=False,
+    next_question="Qual é seu nome completo?"
+)
+
+_FALLBACK_DEFAULT = AIResponse(
+    response_text="Olá! Como posso ajudar você com próteses dentárias hoje?",
+    extracted_data=AIExtractedData(),
+    intent="informacao",
+    confidence=0.7,
+    should_transfer_to_human=False,
+    next_question="Qual tipo de prótese você precisa?"
+)
+
 
 class AIClient:
     """Cliente simples para Gemini 2.5 Flash"""
@@ -23,26 +102,62 @@ class AIClient:
         self.client = None
         self.is_configured = False
         
+        # Partes estáticas do prompt, montadas uma vez (só o meio varia por turno)
+        self._system_prefix = _ROLE_HEADERS["system"] + get_system_prompt() + "\n\n"
+        self._response_suffix = "\n\n\n## SUA RESPOSTA\nResponda APENAS com JSON válido."
+        self._generate_config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=_RESPONSE_SCHEMA,
+            temperature=settings.ai_temperature
+        )
+        
+        # Limite de chamadas simultâneas ao Gemini (back-pressure em rajadas)
+        self._concurrency = asyncio.Semaphore(settings.ai_max_concurrency)
+        
+        # Respostas para prompts idênticos (ver ai/cache.py)
+        self.cache = LLMCache(MemoryBackend())
+        self.semantic_cache = (
+            SemanticCache(
+                model_name=settings.ai_semantic_cache_model,
+                threshold=settings.ai_semantic_cache_threshold
+            )
+            if settings.ai_semantic_cache_enabled else None
+        )
+        
         if not settings.gemini_api_key:
             logger.warning("⚠️  Gemini API key not configured!")
             return
         
         try:
             # Configura cliente Gemini
-            self.client = genai.Client(api_key=settings.gemini_api_key)
+            self.client = genai.Client(api_key=settings.gemini_api_key.get_secret_value())
             self.is_configured = True
             logger.success("✅ Gemini 2.5 Flash configurado (gratuito)")
             
         except Exception as e:
             logger.error(f"❌ Erro ao configurar Gemini: {e}")
     
+    async def warm_up(self) -> None:
+        """
+        Adianta custos de primeira chamada (chamar no startup).
+        Hoje: o modelo de embeddings do cache semântico, que leva segundos
+        para carregar. O google-genai 1.2 abre uma sessão HTTP por chamada,
+        então não há conexão com o Gemini para aquecer.
+        """
+        if self.semantic_cache is not None:
+            await self.semantic_cache.warm_up()
+    
     async def process_message(
         self,
         user_message: str,
         conversation_history: List[Dict[str, str]],
-        lead_data: Optional[Dict[str, Any]] = None
+        lead_data: Optional[Dict[str, Any]] = None,
+        no_cache: bool = False
     ) -> AIResponse:
-        """Processa mensagem do usuário"""
+        """
+        Processa mensagem do usuário.
+        no_cache=True ignora os caches de resposta (sempre chama a API).
+        """
         
         if not self.is_configured:
             logger.error("AI client not configured")
@@ -53,104 +168,131 @@ class AIClient:
             messages = build_triage_prompt(
                 user_message=user_message,
                 conversation_history=conversation_history,
-                lead_data=lead_data
+                lead_data=lead_data,
+                include_system_prompt=False
             )
             
-            logger.info("🤖 Chamando Gemini 2.5 Flash...")
-            
             # Converte mensagens para formato da nova API
             contents = self._format_contents(messages)
             
-            # Chama API
-            response = self.client.models.generate_content(
+            # Prompt idêntico a um recente: responde do cache, sem chamar a API
+            cache_key = self.cache.cache_key(
                 model=settings.gemini_model,
-                contents=contents
+                contents=contents,
+                temperature=settings.ai_temperature
             )
+            cached = None if no_cache else await self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("🤖 Resposta da IA servida do cache")
+                return AIResponse.model_validate(cached)
             
-            # Parse resposta
-            ai_response = self._parse_response(response.text)
+            # Mensagem parecida no mesmo estado da conversa (cache semântico)
+            use_semantic = self.semantic_cache is not None and not no_cache
+            if use_semantic:
+                namespace = self.semantic_cache.namespace(conversation_history, lead_data)
+                cached, embedding = await self.semantic_cache.lookup(namespace, user_message)
+                if cached is not None:
+                    logger.info("🤖 Resposta da IA servida do cache semântico")
+                    return AIResponse.model_validate(cached)
+            
+            logger.info("🤖 Chamando Gemini 2.5 Flash...")
+            
+            response = await self._generate(contents)
+            
+            # Resposta já vem como JSON no schema; valida direto do texto
+            ai_response = AIResponse.model_validate_json(response.text)
             logger.success("✅ Gemini respondeu com sucesso")
             
+            if not no_cache:
+                response_data = ai_response.model_dump()
+                await self.cache.set(cache_key, response_data, settings.ai_temperature)
+                if use_semantic:
+                    await self.semantic_cache.store(namespace, embedding, response_data)
+            
             return ai_response
             
         except Exception as e:
             logger.error(f"❌ Gemini falhou: {e}")
             return self._get_fallback_response(user_message)
     
-    def _format_contents(self, messages: List[Dict[str, str]]) -> str:
-        """Formata mensagens para a nova API"""
-        formatted = []
+    async def _generate(self, contents: str) -> Any:
+        """
+        Chama o Gemini (ver _call_gemini) com timeout global, que cobre
+        também as novas tentativas.
         
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            
-            if role == "system":
-                formatted.append(f"## INSTRUÇÕES DO SISTEMA\n{content}")
-            elif role == "user":
-                formatted.append(f"## USUÁRIO\n{content}")
-            elif role == "assistant":
-                formatted.append(f"## ASSISTENTE\n{content}")
+        Com ai_hedge_ms > 0, se a primeira chamada não voltar nesse prazo
+        dispara uma segunda igual e usa a primeira resposta bem-sucedida;
+        a outra é cancelada. O pior caso fica limitado a ai_timeout_seconds.
+        """
+        def call() -> asyncio.Task:
+            return asyncio.create_task(self._call_gemini(contents))
         
-        formatted.append("\n## SUA RESPOSTA\nResponda APENAS com JSON válido.")
-        return "\n\n".join(formatted)
-    
-    def _parse_response(self, raw_response: str) -> AIResponse:
-        """Parse simples da resposta"""
+        tasks = {call()}
         try:
-            # Limpa resposta
-            text = raw_response.strip()
-            
-            # Extrai JSON
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            
-            if start >= 0 and end > start:
-                json_str = text[start:end]
-                data = json.loads(json_str)
-                return AIResponse(**data)
-            else:
-                raise ValueError("No JSON found")
+            async with asyncio.timeout(settings.ai_timeout_seconds):
+                if settings.ai_hedge_ms:
+                    done, _ = await asyncio.wait(tasks, timeout=settings.ai_hedge_ms / 1000)
+                    if not done:
+                        logger.info(f"🤖 Gemini sem resposta em {settings.ai_hedge_ms}ms, disparando hedge")
+                        tasks.add(call())
                 
-        except Exception as e:
-            logger.error(f"Parse error: {e}")
-            return self._get_fallback_response("")
+                error: Optional[BaseException] = None
+                while tasks:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        error = task.exception()
+                        if error is None:
+                            return task.result()
+                        logger.warning(f"Gemini call failed: {error}")
+                raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    @retry(
+        retry=retry_if_exception(_is_transient),
+        stop=stop_after_attempt(settings.ai_max_retries),
+        wait=wait_random_exponential(multiplier=1, max=10),
+        before_sleep=_log_retry,
+        reraise=True
+    )
+    async def _call_gemini(self, contents: str) -> Any:
+        """
+        Uma chamada ao Gemini. Erros transitórios são repetidos com backoff
+        exponencial com jitter; erros de requisição/autenticação não.
+        A vaga de concorrência é liberada durante a espera entre tentativas.
+        """
+        async with self._concurrency:
+            return await self.client.aio.models.generate_content(
+                model=settings.gemini_model,
+                contents=contents,
+                config=self._generate_config
+            )
+    
+    def _format_contents(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Formata mensagens para a nova API.
+        Recebe só a parte dinâmica (sem o system prompt estático).
+        """
+        dynamic = "\n\n".join([
+            _ROLE_HEADERS[msg["role"]] + msg["content"]
+            for msg in messages
+            if msg["role"] in _ROLE_HEADERS
+        ])
+        return "".join((self._system_prefix, dynamic, self._response_suffix))
     
     def _get_fallback_response(self, user_message: str) -> AIResponse:
         """Resposta inteligente de fallback"""
-        if "urgente" in user_message.lower() and "são paulo" in user_message.lower():
-            return AIResponse(
-                response_text=(
-                    "Olá! Entendo que você precisa de uma prótese dentária urgente em São Paulo. "
-                    "Vou priorizar seu atendimento! Qual é seu nome completo?"
-                ),
-                extracted_data=AIExtractedData(
-                    cidade="São Paulo",
-                    urgencia="alta"
-                ),
-                intent="urgencia",
-                confidence=0.9,
-                should_transfer_to_human=False,
-                next_question="Qual é seu nome completo?"
-            )
-        else:
-            return AIResponse(
-                response_text="Olá! Como posso ajudar você com próteses dentárias hoje?",
-                extracted_data=AIExtractedData(),
-                intent="informacao",
-                confidence=0.7,
-                should_transfer_to_human=False,
-                next_question="Qual tipo de prótese você precisa?"
-            )
+        text = user_message.lower()
+        if "urgente" in text and "são paulo" in text:
+            return _FALLBACK_URGENT_SAO_PAULO
+        return _FALLBACK_DEFAULT
 
 
 # Singleton
-_ai_client = None
-
-def get_ai_client():
-    global _ai_client
-    if _ai_client is None:
-        _ai_client = AIClient()
-    return _ai_client
+@cache
+def get_ai_client() -> AIClient:
+    """Retorna instância única de AIClient (criada na primeira chamada)"""
+    return AIClient()
 
-get_ai_orchestrator = get_ai_client
\ No newline at end of file
+get_ai_orchestrator = get_ai_client
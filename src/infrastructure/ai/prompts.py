@@ -3,6 +3,7 @@ Sistema de prompts para IA.
 Contém templates e lógica de construção de prompts para triagem.
 """
 
+from functools import cache
 from typing import List, Dict, Any, Optional
 from src.core.config import get_settings
 
@@ -45,6 +46,7 @@ Você é a primeira linha de atendimento e sua missão é:
 
 ## CIDADES ATENDIDAS:
 {covered_cities}
+Quando os dados já coletados trouxerem "Cidade atendida", siga essa informação (já verificada pelo sistema).
 
 ## REGRAS IMPORTANTES:
 1. **Seja natural e empático**: Converse como um humano, não como um robô
@@ -113,10 +115,19 @@ Usuário: "ok"
 # BUILDER DE PROMPTS
 # ========================================
 
+@cache
+def get_system_prompt() -> str:
+    """System prompt com as cidades atendidas (formatado uma vez)"""
+    return SYSTEM_PROMPT.format(
+        covered_cities=", ".join(settings.covered_cities_list)
+    )
+
+
 def build_triage_prompt(
     user_message: str,
     conversation_history: List[Dict[str, str]],
-    lead_data: Optional[Dict[str, Any]] = None
+    lead_data: Optional[Dict[str, Any]] = None,
+    include_system_prompt: bool = True
 ) -> List[Dict[str, str]]:
     """
     Constrói prompt completo para a IA com contexto da conversa.
@@ -125,6 +136,8 @@ def build_triage_prompt(
         user_message: Mensagem atual do usuário
         conversation_history: Lista de mensagens anteriores
         lead_data: Dados já coletados do lead (opcional)
+        include_system_prompt: False quando o chamador já tem o
+            system prompt estático em cache (ver AIClient)
         
     Returns:
         Lista de mensagens no formato OpenAI
@@ -133,14 +146,11 @@ def build_triage_prompt(
     messages = []
     
     # ========== 1. SYSTEM PROMPT ==========
-    system_prompt = SYSTEM_PROMPT.format(
-        covered_cities=", ".join(settings.covered_cities_list)
-    )
-    
-    messages.append({
-        "role": "system",
-        "content": system_prompt
-    })
+    if include_system_prompt:
+        messages.append({
+            "role": "system",
+            "content": get_system_prompt()
+        })
     
     # ========== 2. CONTEXTO DE DADOS JÁ COLETADOS ==========
     if lead_data:
@@ -150,6 +160,9 @@ def build_triage_prompt(
             context_parts.append(f"- Nome: {lead_data['name']}")
         if lead_data.get("city"):
             context_parts.append(f"- Cidade: {lead_data['city']}")
+            # Verificação determinística (a IA não precisa comparar com a lista)
+            atendida = "Sim" if settings.is_covered_city(lead_data["city"]) else "Não"
+            context_parts.append(f"- Cidade atendida: {atendida}")
         if lead_data.get("prosthesis_type"):
             context_parts.append(f"- Tipo de prótese: {lead_data['prosthesis_type']}")
         if lead_data.get("urgency_level"):
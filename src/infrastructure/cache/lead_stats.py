@@ -0,0 +1,116 @@
+"""
+Contadores de estatísticas de leads no Redis.
+
+Um hash (leads:stats:counters) guarda total, soma dos scores e um campo por
+status/classificação ("status:novo", "classification:frio"...), atualizado
+com HINCRBY sempre que um lead é criado ou muda. /api/leads/stats lê tudo
+com um HGETALL, sem tocar no banco.
+
+O hash só é considerado válido enquanto a chave leads:stats:ready existir.
+Ela expira periodicamente, forçando uma reconstrução via SQL que corrige
+qualquer desvio (incrementos perdidos em falhas do Redis, por exemplo).
+Alterações feitas fora da API chegam por NOTIFY (database/notifications.py)
+e removem a chave na hora.
+"""
+
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+
+LEAD_COUNTERS_KEY = "leads:stats:counters"
+LEAD_COUNTERS_READY_KEY = "leads:stats:ready"
+LEAD_COUNTERS_REBUILD_SECONDS = 600
+
+# (status, classification, score) de um lead
+LeadSnapshot = Tuple[Optional[str], Optional[str], int]
+
+
+def _value(enum_or_str: Any) -> Optional[str]:
+    """Valor string de um enum (ou a própria string)"""
+    return getattr(enum_or_str, "value", enum_or_str)
+
+
+def lead_snapshot(status: Any, classification: Any, score: Optional[int]) -> LeadSnapshot:
+    """Campos do lead que alimentam os contadores"""
+    return (_value(status), _value(classification), score or 0)
+
+
+async def load_lead_counters(redis: Any) -> Optional[Dict[str, int]]:
+    """Lê os contadores (None se ausentes, expirados ou Redis indisponível)"""
+    if redis is None:
+        return None
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.exists(LEAD_COUNTERS_READY_KEY)
+            pipe.hgetall(LEAD_COUNTERS_KEY)
+            ready, raw = await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Redis unavailable for lead counters: {e}")
+        return None
+    
+    if not ready or not raw:
+        return None
+    return {key.decode(): int(value) for key, value in raw.items()}
+
+
+async def rebuild_lead_counters(redis: Any, counters: Dict[str, int]) -> None:
+    """Substitui os contadores pelos valores calculados no banco"""
+    if redis is None:
+        return
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(LEAD_COUNTERS_KEY)
+            pipe.hset(LEAD_COUNTERS_KEY, mapping=counters)
+            pipe.set(LEAD_COUNTERS_READY_KEY, 1, ex=LEAD_COUNTERS_REBUILD_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Redis unavailable for lead counters: {e}")
+
+
+async def invalidate_lead_counters(redis: Any) -> None:
+    """Força a reconstrução dos contadores na próxima leitura"""
+    if redis is None:
+        return
+    try:
+        await redis.delete(LEAD_COUNTERS_READY_KEY)
+    except Exception as e:
+        logger.warning(f"Redis unavailable for lead counters: {e}")
+
+
+async def record_lead_change(
+    redis: Any,
+    before: Optional[LeadSnapshot],
+    after: LeadSnapshot
+) -> None:
+    """
+    Aplica a diferença entre dois estados do lead nos contadores.
+    before=None indica lead recém-criado.
+    """
+    if redis is None or before == after:
+        return
+    
+    deltas: Counter = Counter()
+    
+    if before is None:
+        deltas["total"] += 1
+    else:
+        status, classification, score = before
+        deltas[f"status:{status}"] -= 1
+        if classification:
+            deltas[f"classification:{classification}"] -= 1
+        deltas["score_sum"] -= score
+    
+    status, classification, score = after
+    deltas[f"status:{status}"] += 1
+    if classification:
+        deltas[f"classification:{classification}"] += 1
+    deltas["score_sum"] += score
+    
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            for field, delta in deltas.items():
+                if delta:
+                    pipe.hincrby(LEAD_COUNTERS_KEY, field, delta)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Redis unavailable for lead counters: {e}")
@@ -3,13 +3,15 @@ Modelos de banco de dados usando SQLAlchemy 2.0.
 Define todas as tabelas e relacionamentos do sistema.
 """
 
+import os
+import time
 from datetime import datetime, UTC
 from typing import Optional
-from uuid import uuid4
+from uuid import UUID as PyUUID
 
 from sqlalchemy import (
-    String, Integer, Boolean, Text, JSON, DateTime, Interval,
-    ForeignKey, Index, UniqueConstraint, Enum as SQLEnum
+    String, Integer, Float, Boolean, Text, JSON, DateTime, Interval,
+    ForeignKey, Index, UniqueConstraint, Enum as SQLEnum, text, event, DDL
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
@@ -20,18 +22,42 @@ from enum import Enum
 # BASE
 # ========================================
 
+def new_id() -> str:
+    """
+    UUIDv7 (RFC 9562) em texto: os 48 bits iniciais são o timestamp em ms.
+    IDs novos ficam no fim do índice da primary key, em vez de espalhados
+    pela árvore como o uuid4; o custo de geração é o mesmo.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    # Versão 7 e variante RFC
+    value = value & ~(0xF << 76) | (0x7 << 76)
+    value = value & ~(0x3 << 62) | (0x2 << 62)
+    return str(PyUUID(int=value))
+
+
+# Usa JSONB no PostgreSQL (binário, aceita índice GIN), JSON no SQLite
+JSONVariant = JSON().with_variant(JSONB(), "postgresql")
+
+# IDs (PKs e FKs): uuid nativo no PostgreSQL (16 bytes, contra 36 do texto,
+# em toda PK, FK e índice que os contém), texto no SQLite. Continuam
+# str no Python (as_uuid=False)
+IdVariant = String(36).with_variant(UUID(as_uuid=False), "postgresql")
+
+
 class Base(DeclarativeBase):
     """Classe base para todos os modelos"""
     
-    # Usa JSONB no PostgreSQL, JSON no SQLite
     type_annotation_map = {
-        dict: JSONB
+        dict: JSONVariant
     }
 
 
 # ========================================
 # ENUMS
 # ========================================
+# Colunas SQLEnum(native_enum=True): tipo ENUM nativo no PostgreSQL
+# (4 bytes por valor, índices menores); VARCHAR no SQLite. Membros novos
+# exigem ALTER TYPE ... ADD VALUE no PostgreSQL
 
 class LeadStatus(str, Enum):
     """Status do lead no funil"""
@@ -100,9 +126,9 @@ class Lead(Base):
     
     # Primary Key
     id: Mapped[str] = mapped_column(
-        String(36),
+        IdVariant,
         primary_key=True,
-        default=lambda: str(uuid4())
+        default=new_id
     )
     
     # Identificação
@@ -126,15 +152,14 @@ class Lead(Base):
     has_insurance: Mapped[Optional[bool]] = mapped_column(Boolean)
     
     # Classificação e roteamento
+    # Sem índice próprio: são a primeira coluna dos compostos em __table_args__
     classification: Mapped[Optional[str]] = mapped_column(
-        SQLEnum(LeadClassification, native_enum=False),
-        index=True
+        SQLEnum(LeadClassification, native_enum=True)
     )
     score: Mapped[int] = mapped_column(Integer, default=0)
     status: Mapped[str] = mapped_column(
-        SQLEnum(LeadStatus, native_enum=False),
-        default=LeadStatus.NEW,
-        index=True
+        SQLEnum(LeadStatus, native_enum=True),
+        default=LeadStatus.NEW
     )
     routed_to: Mapped[Optional[str]] = mapped_column(String(50))
     
@@ -146,13 +171,12 @@ class Lead(Base):
     utm_campaign: Mapped[Optional[str]] = mapped_column(String(100))
     
     # Dados extras (flexível)
-    extra_data: Mapped[Optional[dict]] = mapped_column(JSON)
+    extra_data: Mapped[Optional[dict]] = mapped_column(JSONVariant)
     
-    # Timestamps
+    # Timestamps (created_at indexado por idx_lead_created_id)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(UTC),
-        index=True
+        default=lambda: datetime.now(UTC)
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -164,25 +188,96 @@ class Lead(Base):
     last_message_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     
     # Relacionamentos
+    # lazy="raise_on_sql": carregamento implícito (N+1, e MissingGreenlet na
+    # sessão async) vira erro explícito; use selectinload()/noload() na query.
+    # Objetos já presentes na sessão continuam acessíveis sem SQL.
     conversations: Mapped[list["Conversation"]] = relationship(
         back_populates="lead",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        lazy="raise_on_sql"
     )
     events: Mapped[list["Event"]] = relationship(
         back_populates="lead",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        lazy="raise_on_sql"
     )
     
     # Índices compostos
+    # Ordem das colunas: igualdade primeiro (status, classification),
+    # depois a coluna de ordenação/intervalo (created_at DESC).
+    # Cada índice atende um filtro da listagem; prefixos já cobertos por
+    # outro índice (status, classification, created_at isolados) não são
+    # repetidos, para não pesar nos INSERT/UPDATE
     __table_args__ = (
         Index('idx_lead_classification_status', 'classification', 'status'),
-        Index('idx_lead_created_at_status', 'created_at', 'status'),
+        Index('idx_lead_created_id', text('created_at DESC'), text('id DESC')),
+        # id no fim: a listagem filtrada (ORDER BY created_at DESC, id DESC e
+        # o cursor por (created_at, id)) sai inteira do índice, sem sort
+        Index('idx_lead_status_created', 'status', text('created_at DESC'), text('id DESC')),
+        Index('idx_lead_classification_created', 'classification', text('created_at DESC'), text('id DESC')),
+        # ILIKE '%cidade%' (só PostgreSQL, requer pg_trgm)
+        Index(
+            'idx_lead_city_trgm', 'city',
+            postgresql_using='gin',
+            postgresql_ops={'city': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql'),
+        # Consultas de contenção (extra_data @> '{...}'), só PostgreSQL
+        Index(
+            'idx_lead_extra_gin', 'extra_data',
+            postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
     )
     
     def __repr__(self) -> str:
         return f"<Lead {self.phone_number} - {self.status}>"
 
 
+# Listagem de leads ativos (filtro mais comum do painel)
+Index(
+    'idx_lead_active_created',
+    Lead.created_at.desc(),
+    postgresql_where=Lead.status != LeadStatus.ARCHIVED,
+    sqlite_where=Lead.status != LeadStatus.ARCHIVED
+)
+
+# Extensão necessária para o índice trigram
+event.listen(
+    Lead.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+# Alterações em leads feitas fora da API (scripts, SQL manual) disparam
+# NOTIFY para os workers invalidarem as estatísticas em cache. A própria API
+# atualiza os contadores diretamente e é identificada pelo application_name
+# (settings.db_application_name; os scripts que alteram leads trocam o nome).
+DB_APPLICATION_NAME = "triagem-api"
+LEADS_CHANGED_CHANNEL = "leads_changed"
+
+for _statement in (
+    f"""
+    CREATE OR REPLACE FUNCTION notify_leads_changed() RETURNS trigger AS $$
+    BEGIN
+        IF current_setting('application_name') <> '{DB_APPLICATION_NAME}' THEN
+            PERFORM pg_notify('{LEADS_CHANGED_CHANNEL}', TG_OP);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER leads_changed
+    AFTER INSERT OR DELETE OR UPDATE OF status, classification, score ON leads
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_leads_changed()
+    """,
+):
+    event.listen(
+        Lead.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql")
+    )
+
+
 class Conversation(Base):
     """
     Conversa completa com um lead.
@@ -192,14 +287,14 @@ class Conversation(Base):
     
     # Primary Key
     id: Mapped[str] = mapped_column(
-        String(36),
+        IdVariant,
         primary_key=True,
-        default=lambda: str(uuid4())
+        default=new_id
     )
     
     # Foreign Key
     lead_id: Mapped[str] = mapped_column(
-        String(36),
+        IdVariant,
         ForeignKey("leads.id", ondelete="CASCADE"),
         nullable=False,
         index=True
@@ -207,7 +302,7 @@ class Conversation(Base):
     
     # Status
     status: Mapped[str] = mapped_column(
-        SQLEnum(ConversationStatus, native_enum=False),
+        SQLEnum(ConversationStatus, native_enum=True),
         default=ConversationStatus.ACTIVE,
         index=True
     )
@@ -234,21 +329,36 @@ class Conversation(Base):
     transferred_to_human: Mapped[bool] = mapped_column(Boolean, default=False)
     
     # Relacionamentos
-    lead: Mapped["Lead"] = relationship(back_populates="conversations")
+    # (carregamento explícito, ver Lead.conversations)
+    lead: Mapped["Lead"] = relationship(back_populates="conversations", lazy="raise_on_sql")
     messages: Mapped[list["Message"]] = relationship(
         back_populates="conversation",
         cascade="all, delete-orphan",
-        order_by="Message.created_at"
+        order_by="Message.created_at",
+        lazy="raise_on_sql"
     )
     
     __table_args__ = (
         Index('idx_conv_lead_status', 'lead_id', 'status'),
+        Index('idx_conv_lead_started', 'lead_id', text('started_at DESC')),
+        Index('idx_conv_started', text('started_at DESC')),
     )
     
     def __repr__(self) -> str:
         return f"<Conversation {self.id} - {self.status}>"
 
 
+# No máximo uma conversa ativa por lead: a busca do processador vira
+# uma única sonda no índice (e duas conversas ativas viram erro de integridade)
+Index(
+    'idx_conv_active_lead',
+    Conversation.lead_id,
+    unique=True,
+    postgresql_where=Conversation.status == ConversationStatus.ACTIVE,
+    sqlite_where=Conversation.status == ConversationStatus.ACTIVE
+)
+
+
 class Message(Base):
     """
     Mensagem individual (entrada ou saída).
@@ -257,33 +367,29 @@ class Message(Base):
     
     # Primary Key
     id: Mapped[str] = mapped_column(
-        String(36),
+        IdVariant,
         primary_key=True,
-        default=lambda: str(uuid4())
+        default=new_id
     )
     
     # Foreign Key
     conversation_id: Mapped[str] = mapped_column(
-        String(36),
+        IdVariant,
         ForeignKey("conversations.id", ondelete="CASCADE"),
         nullable=False,
         index=True
     )
     
-    # WhatsApp IDs
-    whatsapp_message_id: Mapped[Optional[str]] = mapped_column(
-        String(255),
-        unique=True,
-        index=True
-    )
+    # WhatsApp IDs (único via idx_msg_whatsapp_id, abaixo)
+    whatsapp_message_id: Mapped[Optional[str]] = mapped_column(String(255))
     
     # Conteúdo
     direction: Mapped[str] = mapped_column(
-        SQLEnum(MessageDirection, native_enum=False),
+        SQLEnum(MessageDirection, native_enum=True),
         nullable=False
     )
     message_type: Mapped[str] = mapped_column(
-        SQLEnum(MessageType, native_enum=False),
+        SQLEnum(MessageType, native_enum=True),
         default=MessageType.TEXT
     )
     content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -293,8 +399,8 @@ class Message(Base):
     ai_model: Mapped[Optional[str]] = mapped_column(String(50))
     ai_tokens_used: Mapped[Optional[int]] = mapped_column(Integer)
     ai_processing_time_ms: Mapped[Optional[int]] = mapped_column(Integer)
-    ai_confidence: Mapped[Optional[float]] = mapped_column(String(10))  # 0.0-1.0
-    extracted_data: Mapped[Optional[dict]] = mapped_column(JSON)
+    ai_confidence: Mapped[Optional[float]] = mapped_column(Float)  # 0.0-1.0
+    extracted_data: Mapped[Optional[dict]] = mapped_column(JSONVariant)
     
     # Status de entrega (para mensagens enviadas)
     sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
@@ -311,18 +417,35 @@ class Message(Base):
     )
     
     # Relacionamento
-    conversation: Mapped["Conversation"] = relationship(back_populates="messages")
+    conversation: Mapped["Conversation"] = relationship(back_populates="messages", lazy="raise_on_sql")
     
     __table_args__ = (
         Index('idx_msg_conversation_created', 'conversation_id', 'created_at'),
         Index('idx_msg_direction_created', 'direction', 'created_at'),
+        Index(
+            'idx_msg_extracted_gin', 'extracted_data',
+            postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
     )
     
     def __repr__(self) -> str:
-        preview = self.content[:30] + "..." if len(self.content) > 30 else self.content
+        # content pode ser None em objetos ainda não preenchidos
+        content = self.content or ""
+        preview = content[:30] + ("..." if len(content) > 30 else "")
         return f"<Message {self.direction} - {preview}>"
 
 
+# Deduplicação de reentregas do webhook (alvo do ON CONFLICT no processador);
+# parcial porque as respostas ainda não enviadas ficam com o ID nulo
+Index(
+    'idx_msg_whatsapp_id',
+    Message.whatsapp_message_id,
+    unique=True,
+    postgresql_where=Message.whatsapp_message_id.is_not(None),
+    sqlite_where=Message.whatsapp_message_id.is_not(None)
+)
+
+
 class Event(Base):
     """
     Eventos do sistema para auditoria e analytics.
@@ -331,27 +454,27 @@ class Event(Base):
     
     # Primary Key
     id: Mapped[str] = mapped_column(
-        String(36),
+        IdVariant,
         primary_key=True,
-        default=lambda: str(uuid4())
+        default=new_id
     )
     
     # Foreign Key (opcional)
     lead_id: Mapped[Optional[str]] = mapped_column(
-        String(36),
+        IdVariant,
         ForeignKey("leads.id", ondelete="CASCADE"),
         index=True
     )
     
     # Tipo de evento
     event_type: Mapped[str] = mapped_column(
-        SQLEnum(EventType, native_enum=False),
+        SQLEnum(EventType, native_enum=True),
         nullable=False,
         index=True
     )
     
     # Dados do evento
-    event_data: Mapped[Optional[dict]] = mapped_column(JSON)
+    event_data: Mapped[Optional[dict]] = mapped_column(JSONVariant)
     
     # Origem do evento
     triggered_by: Mapped[Optional[str]] = mapped_column(String(50))  # 'ai', 'webhook', 'admin'
@@ -364,11 +487,15 @@ class Event(Base):
     )
     
     # Relacionamento
-    lead: Mapped[Optional["Lead"]] = relationship(back_populates="events")
+    lead: Mapped[Optional["Lead"]] = relationship(back_populates="events", lazy="raise_on_sql")
     
     __table_args__ = (
         Index('idx_event_type_created', 'event_type', 'created_at'),
         Index('idx_event_lead_type', 'lead_id', 'event_type'),
+        Index(
+            'idx_event_data_gin', 'event_data',
+            postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
     )
     
     def __repr__(self) -> str:
@@ -0,0 +1,73 @@
+"""
+Escuta de notificações do PostgreSQL (LISTEN/NOTIFY).
+
+O trigger leads_changed (ver models.py) notifica alterações em leads feitas
+fora da API. Cada worker mantém uma conexão asyncpg dedicada no canal e
+invalida os contadores de estatísticas no Redis ao receber uma notificação.
+"""
+
+import asyncio
+from typing import Any, Optional, Set
+from loguru import logger
+
+from src.infrastructure.cache.lead_stats import invalidate_lead_counters
+from src.infrastructure.database.models import LEADS_CHANGED_CHANNEL
+from src.infrastructure.database.session import engine, IS_SQLITE
+
+
+class LeadChangeListener:
+    """
+    Conexão LISTEN no canal leads_changed (só PostgreSQL com Redis).
+    Fora disso, start() não faz nada e os contadores seguem sendo
+    reconstruídos periodicamente.
+    """
+    
+    def __init__(self, redis: Optional[Any] = None):
+        self.redis = redis
+        self._conn: Optional[Any] = None
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def start(self) -> None:
+        """Abre a conexão dedicada e registra o listener (chamar no startup)"""
+        if IS_SQLITE or self.redis is None:
+            return
+        
+        try:
+            import asyncpg
+        except ImportError:
+            logger.warning("asyncpg not installed, lead change notifications disabled")
+            return
+        
+        # Fora do pool: a conexão fica presa no LISTEN durante toda a vida do worker
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        try:
+            self._conn = await asyncpg.connect(dsn)
+            await self._conn.add_listener(LEADS_CHANGED_CHANNEL, self._on_notify)
+            self._conn.add_termination_listener(self._on_terminate)
+        except Exception as e:
+            logger.warning(f"Could not listen for lead changes: {e}")
+            self._conn = None
+            return
+        
+        logger.success(f"✅ Listening on '{LEADS_CHANGED_CHANNEL}'")
+    
+    async def stop(self) -> None:
+        """Fecha a conexão e aguarda invalidações em andamento (shutdown)"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await conn.close()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        """Callback síncrono do asyncpg: agenda a invalidação"""
+        logger.debug(f"Leads changed outside the API ({payload}), invalidating stats")
+        task = asyncio.create_task(invalidate_lead_counters(self.redis))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def _on_terminate(self, connection: Any) -> None:
+        """Conexão perdida: resta a reconstrução periódica dos contadores"""
+        if self._conn is not None:
+            logger.warning("Lead change listener connection lost")
+            self._conn = None
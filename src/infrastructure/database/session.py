@@ -3,16 +3,19 @@ Configuração e gerenciamento de sessões do banco de dados.
 Usa SQLAlchemy 2.0 com suporte assíncrono.
 """
 
+import os
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict
 
+from sqlalchemy import event, inspect, text
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     AsyncEngine,
     create_async_engine,
     async_sessionmaker
 )
-from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import orjson
 from loguru import logger
 
 from src.core.config import get_settings
@@ -20,39 +23,101 @@ from src.infrastructure.database.models import Base
 
 settings = get_settings()
 
+IS_SQLITE = settings.database_url.startswith("sqlite")
+
+# PRAGMAs aplicados em cada nova conexão SQLite:
+# WAL permite leitores simultâneos a um escritor, synchronous=NORMAL evita
+# fsync a cada commit (seguro com WAL) e o cache/mmap mantém páginas em memória
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",  # ~20 MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=134217728",  # 128 MB
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Listener do evento 'connect': aplica os PRAGMAs de performance"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _json_serializer(value: Any) -> str:
+    """Serializa colunas JSON/JSONB com orjson (mais rápido que json.dumps)"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
 # ========================================
 # ENGINE
 # ========================================
 
-def create_engine() -> AsyncEngine:
+def create_engine(read_only: bool = False) -> AsyncEngine:
     """
     Cria engine assíncrona do SQLAlchemy.
     Configuração otimizada para produção e desenvolvimento.
+    
+    Args:
+        read_only: Se True, cria a engine de leitura (no SQLite usa um pool
+            maior, já que leitores não competem pelo lock de escrita)
     """
     
     # Configurações baseadas no ambiente
     engine_kwargs = {
         "echo": settings.db_echo,  # Log de SQL queries
-        "future": True  # SQLAlchemy 2.0 mode
+        "future": True,  # SQLAlchemy 2.0 mode
+        "poolclass": AsyncAdaptedQueuePool,  # Reaproveita conexões abertas
+        # SELECT 1 a cada checkout custa uma ida ao banco por requisição.
+        # Desligado por padrão: o SQLite é local, e no PostgreSQL um erro de
+        # desconexão invalida o pool inteiro (só a requisição que o encontrou
+        # falha) e o recycle descarta conexões antes do timeout de rede
+        "pool_pre_ping": settings.db_pool_pre_ping and not IS_SQLITE,
+        "pool_recycle": 1800,  # Recicla conexões a cada 30min
+        "pool_timeout": settings.db_pool_timeout,  # Falha rápido com pool esgotado
+        "json_serializer": _json_serializer,
+        "json_deserializer": orjson.loads,
+        "pool_use_lifo": True,  # Reusa a conexão mais recente (conexões quentes em rajadas)
     }
     
-    # SQLite: sem pool (não suporta async pool)
-    if settings.database_url.startswith("sqlite"):
-        engine_kwargs["poolclass"] = NullPool
-        logger.info("Using SQLite with NullPool")
+    # SQLite: um único escritor e vários leitores
+    if IS_SQLITE:
+        if read_only:
+            pool_size, max_overflow = os.cpu_count() or 1, 0
+        else:
+            pool_size, max_overflow = 1, 0
+        engine_kwargs.update({
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+        })
+        logger.info(
+            f"Using SQLite with AsyncAdaptedQueuePool "
+            f"({'read' if read_only else 'write'}, size={pool_size})"
+        )
     
     # PostgreSQL: com pool de conexões
     else:
+        pool_size, max_overflow = settings.db_pool_limits
         engine_kwargs.update({
-            "poolclass": QueuePool,
-            "pool_size": settings.db_pool_size,
-            "max_overflow": settings.db_max_overflow,
-            "pool_pre_ping": True,  # Valida conexões antes de usar
-            "pool_recycle": 3600,  # Recicla conexões a cada 1h
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "connect_args": {
+                # Identifica as conexões da API para o trigger leads_changed
+                "server_settings": {"application_name": settings.db_application_name},
+                # Prepared statements por conexão (asyncpg e o cache do dialeto):
+                # as queries do fluxo são sempre as mesmas e deixam de ser
+                # re-preparadas a cada execução. 0 desativa (PgBouncer em modo transaction)
+                "statement_cache_size": settings.db_statement_cache_size,
+                "prepared_statement_cache_size": settings.db_statement_cache_size,
+            },
         })
         logger.info(
-            f"Using PostgreSQL with QueuePool "
-            f"(size={settings.db_pool_size}, max_overflow={settings.db_max_overflow})"
+            f"Using PostgreSQL with AsyncAdaptedQueuePool "
+            f"(size={pool_size}, max_overflow={max_overflow}, workers={settings.worker_count})"
         )
     
     engine = create_async_engine(
@@ -60,12 +125,36 @@ def create_engine() -> AsyncEngine:
         **engine_kwargs
     )
     
+    if IS_SQLITE:
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    
     return engine
 
 
-# Instância global do engine
+# Instância global do engine (escrita)
 engine: AsyncEngine = create_engine()
 
+# Engine de leitura: no SQLite é um pool separado; no PostgreSQL
+# o mesmo pool atende leituras e escritas
+read_engine: AsyncEngine = create_engine(read_only=True) if IS_SQLITE else engine
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """Ocupação dos pools de conexão (para observar overflow e esgotamento)"""
+    engines = {"write": engine}
+    if read_engine is not engine:
+        engines["read"] = read_engine
+    
+    return {
+        name: {
+            "size": eng.pool.size(),
+            "checked_in": eng.pool.checkedin(),
+            "checked_out": eng.pool.checkedout(),
+            "overflow": eng.pool.overflow(),
+        }
+        for name, eng in engines.items()
+    }
+
 
 # ========================================
 # SESSION FACTORY
@@ -79,6 +168,14 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False
+)
+
 
 # ========================================
 # DEPENDENCY INJECTION (FastAPI)
@@ -104,6 +201,23 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency para rotas somente leitura (GETs).
+    Usa a engine de leitura e não faz commit.
+    
+    Uso:
+        @app.get("/conversations/{id}")
+        async def get_conversation(db: AsyncSession = Depends(get_read_db)):
+            ...
+    """
+    async with AsyncReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 # ========================================
 # CONTEXT MANAGER (uso manual)
 # ========================================
@@ -128,6 +242,22 @@ async def get_db_context() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+@asynccontextmanager
+async def get_db_read_context() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Context manager somente leitura para usar fora do FastAPI (scripts, relatórios).
+    
+    Uso:
+        async with get_db_read_context() as db:
+            result = await db.execute(select(Lead))
+    """
+    async with AsyncReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 # ========================================
 # INICIALIZAÇÃO DO BANCO
 # ========================================
@@ -147,8 +277,18 @@ async def init_db() -> None:
                 logger.warning("DROPPING all tables (development mode)")
                 await conn.run_sync(Base.metadata.drop_all)
             
+            # Tabelas que o create_all vai criar (em desenvolvimento, todas)
+            existing = await conn.run_sync(lambda sync_conn: set(inspect(sync_conn).get_table_names()))
+            created = [table for table in Base.metadata.sorted_tables if table.name not in existing]
+            
             # CREATE ALL
             await conn.run_sync(Base.metadata.create_all)
+            
+            # Estatísticas para o planner usar os índices novos, só nas
+            # tabelas criadas agora (as demais já têm; no PostgreSQL o
+            # autovacuum as mantém)
+            for table in created:
+                await conn.execute(text(f"ANALYZE {table.name}"))
             logger.success("Database tables created successfully")
     
     except Exception as e:
@@ -162,9 +302,7 @@ async def check_db_connection() -> bool:
     Útil para health checks.
     """
     try:
-        async with engine.connect() as conn:
-            # Importa text do sqlalchemy
-            from sqlalchemy import text
+        async with read_engine.connect() as conn:
             # Usa text() para envolver a string SQL
             await conn.execute(text("SELECT 1"))
         logger.debug("Database connection OK")
@@ -181,6 +319,8 @@ async def close_db() -> None:
     """
     logger.info("Closing database connections...")
     await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
     logger.success("Database connections closed")
 
 
@@ -194,7 +334,6 @@ async def execute_raw_sql(sql: str) -> None:
     Útil para seeds, migrations manuais, etc.
     """
     async with engine.begin() as conn:
-        from sqlalchemy import text
         await conn.execute(text(sql))
         logger.info(f"Executed raw SQL: {sql[:100]}...")
 
@@ -222,10 +361,8 @@ async def lifespan_db():
         logger.error("Failed to connect to database on startup")
         raise RuntimeError("Database connection failed")
     
-    # Em desenvolvimento, recria tabelas
-    if settings.is_development and settings.debug:
-        await init_db()
-    
+    # Tabelas são criadas fora do lifespan (roda em cada worker):
+    # scripts/run_server.py em desenvolvimento, scripts/init_database.py
     yield
     
     # Shutdown
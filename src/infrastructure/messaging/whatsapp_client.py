@@ -4,6 +4,7 @@ Envia mensagens de texto, botões, templates, etc.
 """
 
 import httpx
+import orjson
 from typing import Optional, Dict, Any, List
 from tenacity import retry, stop_after_attempt, wait_exponential
 from loguru import logger
@@ -14,6 +15,43 @@ from src.core.logging import log_whatsapp_event
 
 settings = get_settings()
 
+# Cabeçalhos de toda chamada à Graph API (montados uma vez; um cliente é
+# criado por lote de mensagens). Os payloads vão pré-serializados com
+# orjson (content=), daí o Content-Type fixo
+_HEADERS = {
+    "Authorization": f"Bearer {settings.whatsapp_access_token.get_secret_value()}",
+    "Content-Type": "application/json"
+}
+
+# Tabela do str.translate que remove todo caractere ASCII que não é dígito
+_ASCII_NON_DIGITS = str.maketrans("", "", "".join(chr(c) for c in range(128) if not chr(c).isdigit()))
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Cria o cliente HTTP de saída (WhatsApp, integrações).
+    Deve ser criado uma vez (lifespan) e compartilhado: o pool mantém as
+    conexões TLS abertas entre requisições.
+    
+    Com o pacote h2 instalado usa HTTP/2: os envios concorrentes para a
+    Graph API são multiplexados na mesma conexão.
+    """
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=50,
+            keepalive_expiry=30.0
+        )
+    )
+
 
 class WhatsAppClient:
     """
@@ -22,19 +60,19 @@ class WhatsAppClient:
     Documentação: https://developers.facebook.com/docs/whatsapp/cloud-api
     """
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Args:
+            http_client: Cliente HTTP compartilhado (app.state.http).
+                Se omitido, cria um próprio (scripts, testes).
+        """
         self.api_url = settings.whatsapp_send_message_url
-        self.access_token = settings.whatsapp_access_token
+        self.access_token = settings.whatsapp_access_token.get_secret_value()
         self.phone_number_id = settings.whatsapp_phone_number_id
+        self.headers = _HEADERS
         
-        # HTTP client com timeout
-        self.client = httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0),
-            headers={
-                "Authorization": f"Bearer {self.access_token}",
-                "Content-Type": "application/json"
-            }
-        )
+        self._owns_client = http_client is None
+        self.client = http_client or create_http_client()
     
     @retry(
         stop=stop_after_attempt(3),
@@ -84,11 +122,12 @@ class WhatsAppClient:
             
             response = await self.client.post(
                 self.api_url,
-                json=payload
+                content=orjson.dumps(payload),
+                headers=self.headers
             )
             
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # Log sucesso
             log_whatsapp_event(
@@ -172,11 +211,11 @@ class WhatsAppClient:
         }
         
         try:
-            response = await self.client.post(self.api_url, json=payload)
+            response = await self.client.post(self.api_url, content=orjson.dumps(payload), headers=self.headers)
             response.raise_for_status()
             
             logger.success(f"✅ Template '{template_name}' sent to {phone_number}")
-            return response.json()
+            return orjson.loads(response.content)
         
         except Exception as e:
             logger.error(f"Failed to send template: {e}")
@@ -239,11 +278,11 @@ class WhatsAppClient:
         }
         
         try:
-            response = await self.client.post(self.api_url, json=payload)
+            response = await self.client.post(self.api_url, content=orjson.dumps(payload), headers=self.headers)
             response.raise_for_status()
             
             logger.success(f"✅ Buttons message sent to {phone_number}")
-            return response.json()
+            return orjson.loads(response.content)
         
         except Exception as e:
             logger.error(f"Failed to send buttons: {e}")
@@ -267,7 +306,7 @@ class WhatsAppClient:
         }
         
         try:
-            response = await self.client.post(self.api_url, json=payload)
+            response = await self.client.post(self.api_url, content=orjson.dumps(payload), headers=self.headers)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -275,8 +314,9 @@ class WhatsAppClient:
             return False
     
     async def close(self):
-        """Fecha o cliente HTTP"""
-        await self.client.aclose()
+        """Fecha o cliente HTTP (apenas se foi criado por esta instância)"""
+        if self._owns_client:
+            await self.client.aclose()
 
 
 # ========================================
@@ -290,8 +330,12 @@ def format_phone_number(phone: str) -> str:
     Entrada: "+55 11 99999-9999" ou "11999999999"
     Saída: "5511999999999"
     """
-    # Remove tudo que não é dígito
-    digits = "".join(filter(str.isdigit, phone))
+    # Remove tudo que não é dígito (translate roda em C; entrada não ASCII
+    # é rara e segue pelo caminho genérico)
+    if phone.isascii():
+        digits = phone.translate(_ASCII_NON_DIGITS)
+    else:
+        digits = "".join(filter(str.isdigit, phone))
     
     # Se não tem código do país, assume Brasil (55)
     if len(digits) == 11:  # Apenas DDD + número